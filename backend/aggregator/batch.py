@@ -0,0 +1,216 @@
+"""Columnar batch ranking and synthesis, for re-scoring stored provider responses offline
+
+Ranks many response sets at once with NumPy, matching ResponseRanker and
+Synthesizer call for call. Streams provider_responses in bounded chunks:
+
+    python -m backend.aggregator.batch --chunk-size 5000 --output rescored.jsonl
+
+Needs NumPy (in requirements.txt); the server itself never imports it.
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import sys
+from typing import AsyncIterator, Dict, Iterator, List, Sequence, Tuple
+import numpy as np
+from sqlalchemy import select
+from backend.aggregator.rank import (
+    CITATION_MARKERS, SENTENCE_TERMINATORS, STRUCTURE_MARKERS, response_features
+)
+from backend.aggregator.synth import Synthesizer
+from backend.db import close_db, read_engine
+from backend.models import ProviderResponse
+
+# Non-ASCII code points str.split() treats as whitespace
+NON_ASCII_SPACE = np.array([133, 160, 5760, *range(8192, 8203), 8232, 8233, 8239, 8287, 12288], dtype=np.uint32)
+# Non-ASCII code points whose str.lower() contains ASCII; texts with these are scored one by one
+LOWER_TO_ASCII = np.array([0x130, 0x212A], dtype=np.uint32)
+MARKER_GROUPS = {"structure": STRUCTURE_MARKERS, "citation": CITATION_MARKERS}
+
+def score_array(word_count: np.ndarray, sentence_count: np.ndarray,
+                has_structure: np.ndarray, has_citation: np.ndarray) -> np.ndarray:
+    """score_features over arrays"""
+    score = np.where((word_count >= 50) & (word_count <= 300), 2, 0)
+    score += word_count > 300
+    score += has_structure
+    score += has_citation
+    score += sentence_count >= 3
+    return score
+
+def _texts_containing(folded: bytes, starts: List[int], marker: str) -> List[int]:
+    """Indexes of the texts whose case-folded bytes contain marker"""
+    needle = marker.encode("ascii")
+    found = []
+    position = folded.find(needle)
+    while position >= 0:
+        index = bisect.bisect_right(starts, position) - 1
+        found.append(index)
+        # One match per text is enough; resume at the next one
+        if index + 1 == len(starts):
+            break
+        position = folded.find(needle, starts[index + 1])
+    return found
+
+class BatchRanker:
+    """Vectorized ResponseRanker over columns of texts"""
+
+    def features(self, texts: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Word and sentence counts and marker flags per text, as response_features computes them"""
+        count = len(texts)
+        if not count:
+            empty = np.zeros(0, dtype=np.int64)
+            return {"word_count": empty, "sentence_count": empty,
+                    "structure": empty.astype(bool), "citation": empty.astype(bool)}
+
+        # One array for the whole batch: bytes when it is all ASCII, code
+        # points otherwise. The newline after each text ends words,
+        # terminator runs and markers at the boundary.
+        joined = "\n".join(texts) + "\n"
+        if joined.isascii():
+            codes = np.frombuffer(joined.encode("ascii"), dtype=np.uint8)
+        else:
+            codes = np.frombuffer(joined.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+        lengths = np.fromiter(map(len, texts), dtype=np.int64, count=count) + 1
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        bounds = np.append(starts, len(codes))
+
+        def count_runs(mask: np.ndarray) -> np.ndarray:
+            run_starts = np.empty_like(mask)
+            run_starts[0] = mask[0]
+            np.greater(mask[1:], mask[:-1], out=run_starts[1:])
+            return np.diff(np.searchsorted(np.flatnonzero(run_starts), bounds))
+
+        space = (codes == 32) | ((codes >= 9) & (codes <= 13)) | ((codes >= 28) & (codes <= 31))
+        rescan = np.zeros(0, dtype=np.int64)
+        if codes.dtype != np.uint8:
+            non_ascii = np.flatnonzero(codes >= 128)
+            space[non_ascii] = np.isin(codes[non_ascii], NON_ASCII_SPACE)
+            special = non_ascii[np.isin(codes[non_ascii], LOWER_TO_ASCII)]
+            rescan = np.unique(np.searchsorted(starts, special, side="right") - 1)
+        word_count = count_runs(~space)
+        terminator = np.zeros_like(space)
+        for char in SENTENCE_TERMINATORS:
+            terminator |= codes == ord(char)
+        sentence_count = count_runs(terminator)
+
+        # Markers are ASCII, so lowercasing just the ASCII letters gives the
+        # same matches as str.lower() for everything but LOWER_TO_ASCII, which
+        # is rare enough to redo in Python. Other code points become NUL.
+        upper = (codes >= 65) & (codes <= 90)
+        folded = np.where(codes < 128, codes, 0).astype(np.uint8) | (upper.view(np.uint8) << 5)
+        folded_bytes, text_starts = folded.tobytes(), starts.tolist()
+        features = {"word_count": word_count, "sentence_count": sentence_count}
+        for group, markers in MARKER_GROUPS.items():
+            found = np.zeros(count, dtype=bool)
+            for marker in markers:
+                found[_texts_containing(folded_bytes, text_starts, marker)] = True
+            features[group] = found
+
+        for index in rescan:
+            _, _, structure, citation = response_features(texts[index])
+            features["structure"][index] = structure
+            features["citation"][index] = citation
+        return features
+
+    def scores(self, texts: Sequence[str]) -> np.ndarray:
+        features = self.features(texts)
+        return score_array(features["word_count"], features["sentence_count"],
+                           features["structure"], features["citation"])
+
+    def rank(self, group_ids: Sequence, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Rank every group of rows at once
+
+        Rows of a group must be contiguous and in the order the single-call
+        path would see them as dict items. Returns the row order, best first
+        within each group, and the offsets where each group starts in it.
+        """
+        ids = np.asarray(group_ids, dtype=object)
+        if not len(ids):
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+        boundaries = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+        group_index = np.zeros(len(ids), dtype=np.int64)
+        group_index[boundaries] = 1
+        group_index = np.cumsum(group_index)
+        # lexsort is stable, so ties keep dict order as list.sort does
+        order = np.lexsort((-self.scores(texts), group_index))
+        return order, np.concatenate(([0], boundaries))
+
+    def rank_groups(self, group_ids: Sequence, providers: Sequence[str],
+                    texts: Sequence[str]) -> Iterator[Tuple[object, List[str], List[str]]]:
+        """(group id, providers best first, texts best first) for each group"""
+        order, starts = self.rank(group_ids, texts)
+        ends = np.append(starts[1:], len(order))
+        for start, end in zip(starts, ends):
+            rows = order[start:end]
+            yield group_ids[rows[0]], [providers[row] for row in rows], [texts[row] for row in rows]
+
+def synthesize_batch(group_ids: Sequence, providers: Sequence[str],
+                     texts: Sequence[str]) -> Iterator[Tuple[object, List[str], str]]:
+    """(group id, providers best first, synthesized answer) for each group, as Synthesizer.synthesize gives"""
+    synthesizer = Synthesizer()
+    for group_id, ranked_providers, ranked in BatchRanker().rank_groups(group_ids, providers, texts):
+        responses = dict(zip(ranked_providers, ranked))
+        yield group_id, ranked_providers, "".join(synthesizer.synthesize_stream(responses, ranked))
+
+async def stream_provider_responses(chunk_size: int) -> AsyncIterator[Tuple[List[str], List[str], List[str]]]:
+    """Columns of provider_responses, whole messages at a time, about chunk_size rows per chunk"""
+    # Responses of an answer are created in the order they were ranked in; id breaks ties
+    stmt = select(ProviderResponse.message_id, ProviderResponse.provider, ProviderResponse.content).order_by(
+        ProviderResponse.message_id, ProviderResponse.created_at, ProviderResponse.id
+    )
+    carry: List[Tuple[str, str, str]] = []
+    async with read_engine.connect() as conn:
+        result = await conn.stream(stmt.execution_options(yield_per=chunk_size))
+        async for partition in result.partitions(chunk_size):
+            rows = carry + [tuple(row) for row in partition]
+            # The last message may continue in the next partition
+            split = len(rows)
+            while split and rows[split - 1][0] == rows[-1][0]:
+                split -= 1
+            rows, carry = rows[:split], rows[split:]
+            if rows:
+                yield tuple(list(column) for column in zip(*rows))
+    if carry:
+        yield tuple(list(column) for column in zip(*carry))
+
+async def rescore(chunk_size: int, synthesize: bool, output) -> int:
+    """Write one JSON line per message; returns the number of messages"""
+    ranker = BatchRanker()
+    written = 0
+    try:
+        async for message_ids, providers, texts in stream_provider_responses(chunk_size):
+            if synthesize:
+                results = synthesize_batch(message_ids, providers, texts)
+            else:
+                results = ((message_id, ranking, None) for message_id, ranking, _ in
+                           ranker.rank_groups(message_ids, providers, texts))
+            for message_id, ranking, synthesized in results:
+                record = {"message_id": message_id, "ranking": ranking}
+                if synthesize:
+                    record["synthesized"] = synthesized
+                output.write(json.dumps(record) + "\n")
+                written += 1
+    finally:
+        await close_db()
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows held in memory at a time")
+    parser.add_argument("--synthesize", action="store_true", help="Include the synthesized answer")
+    parser.add_argument("--output", help="JSON lines file; stdout when omitted")
+    args = parser.parse_args()
+
+    # SQL echo would interleave with JSON lines on stdout
+    read_engine.echo = False
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        written = asyncio.run(rescore(args.chunk_size, args.synthesize, output))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"Re-scored {written} messages", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
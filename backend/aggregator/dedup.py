@@ -0,0 +1,104 @@
+import heapq
+import re
+from typing import Dict, List
+
+SHINGLE_WORDS = 3
+# Smallest shingle hashes kept per sentence; near-duplicates share one of them
+SKETCH_SIZE = 4
+SIMILARITY_THRESHOLD = 0.5
+# Newest sentences compared per sketch key, so boilerplate cannot go quadratic
+MAX_POSTINGS = 32
+MIN_SENTENCE_CHARS = 20
+
+_SENTENCES = re.compile(r'[^.!?]+[.!?]*')
+_WORDS = re.compile(r'\w+')
+
+class Sentence:
+    __slots__ = ["text", "response", "words", "shingles"]
+
+    def __init__(self, text: str, response: int, words: List[str]):
+        self.text = text
+        self.response = response
+        self.words = words
+        if len(words) <= SHINGLE_WORDS:
+            self.shingles = {hash(tuple(words))}
+        else:
+            self.shingles = {hash(tuple(words[i:i + SHINGLE_WORDS])) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+def split_sentences(text: str, response: int) -> List[Sentence]:
+    sentences = []
+    for match in _SENTENCES.finditer(text):
+        sentence = match.group().strip()
+        words = _WORDS.findall(sentence.lower())
+        if words:
+            sentences.append(Sentence(sentence, response, words))
+    return sentences
+
+class SentenceClusters:
+    """Near-duplicate sentences across responses, clustered by word shingles
+
+    Each response is tokenized once, and sentences are indexed by a
+    bottom-k sketch of their shingle hashes: only sentences sharing a
+    sketch key are compared, so the work grows with the total number of
+    words rather than sentences times vocabulary.
+    """
+
+    def __init__(self, responses: List[str]):
+        """responses in rank order; the first is the base answer"""
+        self.sentences: List[Sentence] = []
+        self._parent: List[int] = []
+        self._postings: Dict[int, List[int]] = {}
+        for response, text in enumerate(responses):
+            for sentence in split_sentences(text, response):
+                self._add(sentence)
+
+    def _find(self, index: int) -> int:
+        parent = self._parent
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    def _add(self, sentence: Sentence):
+        index = len(self.sentences)
+        self.sentences.append(sentence)
+        self._parent.append(index)
+        for key in heapq.nsmallest(SKETCH_SIZE, sentence.shingles):
+            postings = self._postings.setdefault(key, [])
+            for other in postings[-MAX_POSTINGS:]:
+                root, other_root = self._find(index), self._find(other)
+                if root == other_root:
+                    continue
+                shingles = self.sentences[other].shingles
+                overlap = len(sentence.shingles & shingles)
+                if overlap / (len(sentence.shingles) + len(shingles) - overlap) >= SIMILARITY_THRESHOLD:
+                    # The earliest sentence, from the best-ranked response, stays the root
+                    self._parent[max(root, other_root)] = min(root, other_root)
+            postings.append(index)
+
+    def clusters(self) -> Dict[int, List[int]]:
+        """Sentence indexes by cluster root, each in rank order"""
+        clusters: Dict[int, List[int]] = {}
+        for index in range(len(self.sentences)):
+            clusters.setdefault(self._find(index), []).append(index)
+        return clusters
+
+    def novel_sentences(self, limit: int) -> List[str]:
+        """Representatives of clusters the base answer does not cover
+
+        Clusters backed by more responses come first, then those from
+        better-ranked responses. The representative is the cluster's
+        sentence from the best-ranked response, and must add a word the
+        base answer does not use.
+        """
+        base_words = {word for sentence in self.sentences if sentence.response == 0 for word in sentence.words}
+        candidates = []
+        for root, members in self.clusters().items():
+            representative = self.sentences[root]
+            if representative.response == 0 or len(representative.text) <= MIN_SENTENCE_CHARS:
+                continue
+            if all(word in base_words for word in representative.words):
+                continue
+            support = len({self.sentences[member].response for member in members})
+            candidates.append((-support, root))
+        return [self.sentences[root].text for _, root in heapq.nsmallest(limit, candidates)]
@@ -1,37 +1,180 @@
-from typing import List, Dict
+from typing import Dict, Iterable, List, Optional, Tuple
 import re
 
+STRUCTURE_MARKERS = ["first", "second", "third", "finally", "in conclusion"]
+CITATION_MARKERS = ["based on", "according to", "research shows"]
+SENTENCE_TERMINATORS = ".!?"
+
+def score_features(word_count: int, sentence_count: int, has_structure: bool, has_citation: bool) -> int:
+    """Quality score from response features; shared by every ranking path"""
+    score = 0
+
+    # Length scoring (moderate length is better)
+    if 50 <= word_count <= 300:
+        score += 2
+    elif word_count > 300:
+        score += 1
+
+    # Structure scoring
+    if has_structure:
+        score += 1
+
+    # Question answering indicators
+    if has_citation:
+        score += 1
+
+    # Clarity indicators
+    if sentence_count >= 3:
+        score += 1
+
+    return score
+
+def response_features(response: str) -> Tuple[int, int, bool, bool]:
+    """Arguments to score_features for a complete response"""
+    lowered = response.lower()
+    return (
+        len(response.split()),
+        len(re.findall(r'[.!?]+', response)),
+        any(marker in lowered for marker in STRUCTURE_MARKERS),
+        any(marker in lowered for marker in CITATION_MARKERS)
+    )
+
 class ResponseRanker:
     @staticmethod
     def rank_responses(responses: Dict[str, str]) -> List[str]:
         """Rank responses by quality indicators"""
         scored_responses = []
-        
+
         for provider, response in responses.items():
-            score = 0
-            
-            # Length scoring (moderate length is better)
-            length = len(response.split())
-            if 50 <= length <= 300:
-                score += 2
-            elif length > 300:
-                score += 1
-            
-            # Structure scoring
-            if any(marker in response.lower() for marker in ["first", "second", "third", "finally", "in conclusion"]):
-                score += 1
-            
-            # Question answering indicators
-            if any(marker in response.lower() for marker in ["based on", "according to", "research shows"]):
-                score += 1
-            
-            # Clarity indicators
-            sentence_count = len(re.findall(r'[.!?]+', response))
-            if sentence_count >= 3:
-                score += 1
-            
+            score = score_features(*response_features(response))
             scored_responses.append((provider, response, score))
-        
+
         # Sort by score descending
         scored_responses.sort(key=lambda x: x[2], reverse=True)
-        return [resp[1] for resp in scored_responses]
\ No newline at end of file
+        return [resp[1] for resp in scored_responses]
+
+class MarkerMatcher:
+    """Aho-Corasick automaton over lowercase marker phrases
+
+    Built as a full transition table, so each character costs one dict
+    lookup, and characters outside the markers' alphabet reset to the root.
+    """
+
+    def __init__(self, groups: Dict[str, Iterable[str]]):
+        # goto[state][char] -> state; output[state] -> groups ending there
+        goto: List[Dict[str, int]] = [{}]
+        output: List[set] = [set()]
+        for group, markers in groups.items():
+            for marker in markers:
+                state = 0
+                for char in marker:
+                    if char not in goto[state]:
+                        goto.append({})
+                        output.append(set())
+                        goto[state][char] = len(goto) - 1
+                    state = goto[state][char]
+                output[state].add(group)
+
+        # Breadth-first failure links, folded into the transition table
+        fail = [0] * len(goto)
+        order = list(goto[0].values())
+        alphabet = {char for transitions in goto for char in transitions}
+        for state in order:
+            for char, target in goto[state].items():
+                order.append(target)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[target] = goto[fallback].get(char, 0)
+                output[target] |= output[fail[target]]
+        # In BFS order, so every fallback state is already complete
+        for state in order:
+            for char in alphabet:
+                if char not in goto[state]:
+                    goto[state][char] = goto[fail[state]].get(char, 0)
+        self.goto = goto
+        self.output = [frozenset(found) for found in output]
+
+class MarkerScanner:
+    """Streaming matcher state; matches may span token boundaries"""
+
+    def __init__(self, matcher: MarkerMatcher):
+        self.matcher = matcher
+        self.state = 0
+        self.found: set = set()
+
+    def feed(self, text: str):
+        goto, output = self.matcher.goto, self.matcher.output
+        state = self.state
+        for char in text:
+            state = goto[state].get(char, 0)
+            if output[state]:
+                self.found |= output[state]
+        self.state = state
+
+MARKER_MATCHER = MarkerMatcher({"structure": STRUCTURE_MARKERS, "citation": CITATION_MARKERS})
+_TERMINATOR_RUNS = re.compile(r'[.!?]+')
+
+class ResponseFeatures:
+    """Ranking features of one response, updated token by token"""
+
+    def __init__(self):
+        self.word_count = 0
+        self.sentence_count = 0
+        self.markers = MarkerScanner(MARKER_MATCHER)
+        self._in_word = False
+        self._in_terminators = False
+
+    def feed(self, token: str):
+        if not token:
+            return
+        # Words and terminator runs continue across token boundaries
+        words = len(token.split())
+        if words and self._in_word and not token[0].isspace():
+            words -= 1
+        self.word_count += words
+        self._in_word = not token[-1].isspace()
+
+        runs = len(_TERMINATOR_RUNS.findall(token))
+        if runs and self._in_terminators and token[0] in SENTENCE_TERMINATORS:
+            runs -= 1
+        self.sentence_count += runs
+        self._in_terminators = token[-1] in SENTENCE_TERMINATORS
+
+        if len(self.markers.found) < 2:
+            self.markers.feed(token.lower())
+
+    def score(self) -> int:
+        found = self.markers.found
+        return score_features(self.word_count, self.sentence_count, "structure" in found, "citation" in found)
+
+class IncrementalRanker:
+    """Ranks streamed responses from features kept up to date during streaming
+
+    Produces the same order as ResponseRanker.rank_responses, but at
+    completion only sorts per-provider scores.
+    """
+
+    def __init__(self):
+        self.features: Dict[str, ResponseFeatures] = {}
+
+    def stream(self, provider: str) -> ResponseFeatures:
+        """Fresh features for a provider's response, replacing any earlier ones"""
+        features = self.features[provider] = ResponseFeatures()
+        return features
+
+    def set(self, provider: str, response: str):
+        """Use a complete response, e.g. an error message, for a provider"""
+        self.stream(provider).feed(response)
+
+    def rank(self, responses: Dict[str, str]) -> List[str]:
+        """Rank responses in dict order for ties, as rank_responses does"""
+        scored: List[Tuple[int, str]] = []
+        for provider, response in responses.items():
+            features: Optional[ResponseFeatures] = self.features.get(provider)
+            if features is None:
+                features = self.stream(provider)
+                features.feed(response)
+            scored.append((features.score(), response))
+        scored.sort(key=lambda x: x[0], reverse=True)
+        return [response for _, response in scored]
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import AsyncGenerator, Callable, List, Optional, Tuple
+from sqlalchemy import delete
+from config import settings
+from backend.db import AsyncSessionLocal, ReadSessionLocal
+from backend.models import CachedResponse
+from backend.providers.base import ProviderClient
+from backend.utils.metrics import metrics
+from backend.utils.text import normalize_text
+
+cache_requests = metrics.counter(
+    "response_cache_requests_total", "Response cache lookups", ["provider", "result"]
+)
+
+class ResponseCache:
+    """Exact-match provider response cache: in-memory LRU over a SQLite table"""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key -> (provider, tokens, size in bytes, expiry as a monotonic time)
+        self._entries: "OrderedDict[str, Tuple[str, List[str], int, float]]" = OrderedDict()
+        self._bytes = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: str) -> str:
+        raw = "\x00".join([provider, model, normalize_text(prompt)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, provider: str, tokens: List[str], expires_at: float):
+        self._forget(key)
+        size = sum(len(token.encode("utf-8")) for token in tokens)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (provider, tokens, size, expires_at)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, _, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+
+    def _forget(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._bytes -= entry[2]
+
+    async def get(self, provider: str, model: str, prompt: str) -> Optional[List[str]]:
+        key = self.make_key(provider, model, prompt)
+        entry = self._entries.get(key)
+        if entry and entry[3] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+            cache_requests.inc(provider=provider, result="memory_hit")
+            return entry[1]
+        if entry:
+            self._forget(key)
+
+        async with ReadSessionLocal() as db:
+            cached = await db.get(CachedResponse, key)
+        if cached and cached.expires_at > datetime.utcnow():
+            tokens = json.loads(cached.tokens)
+            remaining = (cached.expires_at - datetime.utcnow()).total_seconds()
+            self._remember(key, provider, tokens, time.monotonic() + remaining)
+            self.db_hits += 1
+            cache_requests.inc(provider=provider, result="db_hit")
+            return tokens
+        if cached:
+            # Only expired entries take the write connection
+            async with AsyncSessionLocal() as db:
+                await db.execute(delete(CachedResponse).where(CachedResponse.key == key))
+                await db.commit()
+
+        self.misses += 1
+        cache_requests.inc(provider=provider, result="miss")
+        return None
+
+    async def set(self, provider: str, model: str, prompt: str, tokens: List[str]):
+        key = self.make_key(provider, model, prompt)
+        self._remember(key, provider, tokens, time.monotonic() + self.ttl)
+        async with AsyncSessionLocal() as db:
+            await db.merge(CachedResponse(
+                key=key,
+                provider=provider,
+                model=model,
+                prompt=normalize_text(prompt),
+                tokens=json.dumps(tokens),
+                created_at=datetime.utcnow(),
+                expires_at=datetime.utcnow() + timedelta(seconds=self.ttl)
+            ))
+            await db.commit()
+
+    async def stream(
+        self, provider: ProviderClient, prompt: str, mark: Optional[Callable[[str], None]] = None
+    ) -> AsyncGenerator[str, None]:
+        """Replay a cached response at full speed, or generate and cache it
+
+        mark, if given, is called with "cache" before a replay.
+        """
+        name = provider.get_name()
+        if settings.RESPONSE_CACHE_ENABLED:
+            tokens = await self.get(name, provider.model, prompt)
+            if tokens is not None:
+                if mark is not None:
+                    mark("cache")
+                for token in tokens:
+                    yield token
+                return
+
+        tokens = []
+        async for token in provider.generate(prompt):
+            tokens.append(token)
+            yield token
+        # Only complete, error-free responses reach this point
+        if settings.RESPONSE_CACHE_ENABLED and tokens:
+            await self.set(name, provider.model, prompt, tokens)
+
+    async def invalidate(self, provider: Optional[str] = None) -> int:
+        """Drop cached responses, for one provider or all of them"""
+        async with AsyncSessionLocal() as db:
+            query = delete(CachedResponse)
+            if provider:
+                query = query.where(CachedResponse.provider == provider)
+            result = await db.execute(query)
+            await db.commit()
+        keys = [
+            key for key, entry in self._entries.items()
+            if provider is None or entry[0] == provider
+        ]
+        for key in keys:
+            self._forget(key)
+        return result.rowcount
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.db_hits
+        lookups = hits + self.misses
+        return {
+            "enabled": settings.RESPONSE_CACHE_ENABLED,
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl
+        }
+
+response_cache = ResponseCache(
+    settings.RESPONSE_CACHE_MAX_ENTRIES,
+    settings.RESPONSE_CACHE_MAX_BYTES,
+    settings.RESPONSE_CACHE_TTL
+)
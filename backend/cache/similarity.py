@@ -0,0 +1,192 @@
+import hashlib
+import re
+import struct
+from array import array
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, select
+from config import settings
+from backend.db import ReadSessionLocal
+from backend.models import Message, PromptSignature, ProviderResponse
+from backend.persistence import persistence
+from backend.utils.metrics import metrics
+from backend.utils.text import normalize_text
+
+NUM_PERM = 32
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+# Newest entries per LSH bucket that are compared against a lookup
+MAX_BUCKET_CANDIDATES = 32
+
+_SIGNATURE_FORMAT = struct.Struct(f"<{NUM_PERM}I")
+_unpack_row = _SIGNATURE_FORMAT.unpack
+
+similar_lookups = metrics.counter(
+    "similar_prompt_lookups_total", "Near-duplicate prompt index lookups", ["result"]
+)
+
+def canonical_prompt(prompt: str) -> str:
+    """normalize_text, then drop casing and punctuation"""
+    text = normalize_text(prompt).lower()
+    return " ".join(re.findall(r"\w+", text))
+
+def exact_features(prompt: str) -> Tuple[str, ...]:
+    """Numeric tokens, which a near-duplicate must match exactly
+
+    MinHash barely notices a changed number ("12 times 13" vs "12 times 14"),
+    yet it makes a different question. Added or reworded words are left to
+    the similarity threshold.
+    """
+    return tuple(token for token in canonical_prompt(prompt).split() if any(char.isdigit() for char in token))
+
+def shingles(text: str) -> set:
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+def minhash_signature(prompt: str) -> Tuple[int, ...]:
+    """MinHash over character shingles of the canonical prompt"""
+    # Each 32-bit word of one SHAKE-128 digest acts as an independent hash
+    # function, which is far cheaper than NUM_PERM modular permutations
+    rows = [
+        _unpack_row(hashlib.shake_128(shingle.encode("utf-8")).digest(NUM_PERM * 4))
+        for shingle in shingles(canonical_prompt(prompt))
+    ]
+    return tuple(map(min, zip(*rows)))
+
+def pack_signature(signature: Tuple[int, ...]) -> bytes:
+    return _SIGNATURE_FORMAT.pack(*signature)
+
+def unpack_signature(data: bytes) -> Tuple[int, ...]:
+    return _SIGNATURE_FORMAT.unpack(data)
+
+class SimilarityIndex:
+    """MinHash signatures of past prompts, bucketed with LSH"""
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        # Flat signature storage: entry i occupies [i * NUM_PERM, (i + 1) * NUM_PERM)
+        self._signatures = array("I")
+        self._response_ids: List[str] = []
+        self._features: List[Tuple[str, ...]] = []
+        self._buckets: List[Dict[int, object]] = [{} for _ in range(BANDS)]
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._response_ids)
+
+    @staticmethod
+    def _band_keys(signature: Tuple[int, ...]) -> List[int]:
+        return [hash(signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+    def insert(self, signature: Tuple[int, ...], response_message_id: str,
+               features: Tuple[str, ...]):
+        index = len(self._response_ids)
+        self._signatures.extend(signature)
+        self._response_ids.append(response_message_id)
+        self._features.append(features)
+        for band, key in enumerate(self._band_keys(signature)):
+            bucket = self._buckets[band]
+            # Most buckets hold a single entry; only promote to a list when shared
+            existing = bucket.get(key)
+            if existing is None:
+                bucket[key] = index
+            elif isinstance(existing, list):
+                existing.append(index)
+            else:
+                bucket[key] = [existing, index]
+
+    def lookup(self, prompt: str) -> Optional[Tuple[str, float]]:
+        """Best stored response for a near-duplicate prompt, with its similarity"""
+        signature = minhash_signature(prompt)
+        features = exact_features(prompt)
+        best_index, best_similarity = -1, 0.0
+        seen = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            entry = self._buckets[band].get(key)
+            if entry is None:
+                continue
+            candidates = entry[-MAX_BUCKET_CANDIDATES:] if isinstance(entry, list) else [entry]
+            for index in candidates:
+                if index in seen:
+                    continue
+                seen.add(index)
+                if self._features[index] != features:
+                    continue
+                stored = self._signatures[index * NUM_PERM:(index + 1) * NUM_PERM]
+                similarity = sum(1 for x, y in zip(signature, stored) if x == y) / NUM_PERM
+                # Prefer the newest answer among equally similar prompts
+                if similarity > best_similarity or (similarity == best_similarity and index > best_index):
+                    best_index, best_similarity = index, similarity
+        if best_index < 0 or best_similarity < self.threshold:
+            similar_lookups.inc(result="miss")
+            return None
+        similar_lookups.inc(result="hit")
+        return self._response_ids[best_index], best_similarity
+
+    async def add(self, user_message_id: str, response_message_id: str, prompt: str):
+        """Index an answered prompt and persist its signature"""
+        signature = minhash_signature(prompt)
+        self.insert(signature, response_message_id, exact_features(prompt))
+        # Written behind with the answer it points to, in the same transaction or after it
+        await persistence.add(
+            PromptSignature,
+            message_id=user_message_id,
+            response_message_id=response_message_id,
+            signature=pack_signature(signature)
+        )
+
+    async def load(self):
+        """Load persisted signatures, then index only exchanges newer than them
+
+        A read-only scan; signatures it computes are written behind.
+        """
+        async with ReadSessionLocal() as db:
+            # The prompt itself is needed for the features that must match exactly
+            result = await db.stream(
+                select(PromptSignature.signature, PromptSignature.response_message_id, Message.content)
+                .join(Message, Message.id == PromptSignature.message_id)
+                .order_by(PromptSignature.created_at)
+            )
+            async for signature, response_message_id, prompt in result:
+                self.insert(unpack_signature(signature), response_message_id, exact_features(prompt))
+
+            watermark = (await db.execute(
+                select(func.max(Message.created_at))
+                .join(PromptSignature, PromptSignature.message_id == Message.id)
+            )).scalar()
+            await self._backfill(db, watermark)
+        self.loaded = True
+
+    async def _backfill(self, db, watermark):
+        # Aggregate answers are the assistant messages with several provider responses
+        aggregate_ids = (
+            select(ProviderResponse.message_id)
+            .join(Message, Message.id == ProviderResponse.message_id)
+            .group_by(ProviderResponse.message_id)
+            .having(func.count(ProviderResponse.id) > 1)
+        )
+        query = select(Message).order_by(Message.chat_id, Message.created_at)
+        if watermark is not None:
+            aggregate_ids = aggregate_ids.where(Message.created_at > watermark)
+            query = query.where(Message.created_at > watermark)
+        aggregate = set((await db.execute(aggregate_ids)).scalars().all())
+        result = await db.stream(query)
+
+        pending_prompt = None
+        async for message in result.scalars():
+            if message.is_user:
+                pending_prompt = message
+            elif pending_prompt is not None and pending_prompt.chat_id == message.chat_id:
+                if message.id in aggregate:
+                    signature = minhash_signature(pending_prompt.content)
+                    self.insert(signature, message.id, exact_features(pending_prompt.content))
+                    await persistence.add(
+                        PromptSignature,
+                        message_id=pending_prompt.id,
+                        response_message_id=message.id,
+                        signature=pack_signature(signature)
+                    )
+                pending_prompt = None
+
+similarity_index = SimilarityIndex(settings.SIMILAR_PROMPT_THRESHOLD)
@@ -10,8 +10,36 @@ class Settings:
     DEEPSEEK_API_KEY: str = os.getenv("DEEPSEEK_API_KEY", "sk-test-deepseek-key-123")
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "AIza-test-gemini-key-123")
     
+    # Upstream base URLs, e.g. to point providers at backend/providers/mock_upstream.py
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+    GROQ_BASE_URL: str = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+    DEEPSEEK_BASE_URL: str = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1")
+    
+    # Enabled providers, in order: built-in or entry point names, or name=module:Class
+    PROVIDERS: str = os.getenv("PROVIDERS", "openai,groq,deepseek,gemini")
+    PROVIDER_WARMUP: bool = os.getenv("PROVIDER_WARMUP", "true").lower() == "true"
+    
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./chat.db")
+    # Read-only lookups; empty reads DATABASE_URL through a separate pool
+    DATABASE_READ_URL: str = os.getenv("DATABASE_READ_URL", "")
+    DB_ECHO: bool = os.getenv("DB_ECHO", "false").lower() == "true"  # log every SQL statement
+    DB_WRITE_POOL_SIZE: int = int(os.getenv("DB_WRITE_POOL_SIZE", "1"))  # SQLite takes one writer at a time
+    DB_READ_POOL_SIZE: int = int(os.getenv("DB_READ_POOL_SIZE", "8"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds waiting for a connection
+    # SQLite pragmas, set on every connection
+    DB_JOURNAL_MODE: str = os.getenv("DB_JOURNAL_MODE", "WAL")
+    DB_SYNCHRONOUS: str = os.getenv("DB_SYNCHRONOUS", "NORMAL")  # durable at checkpoints under WAL
+    DB_BUSY_TIMEOUT_MS: int = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+    DB_CACHE_SIZE_KB: int = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))  # page cache per connection
+    DB_MMAP_SIZE: int = int(os.getenv("DB_MMAP_SIZE", str(128 * 1024 * 1024)))
+    
+    # Write-behind persistence: rows waiting before producers block, and rows per transaction
+    PERSIST_QUEUE_SIZE: int = int(os.getenv("PERSIST_QUEUE_SIZE", "10000"))
+    PERSIST_BATCH_ROWS: int = int(os.getenv("PERSIST_BATCH_ROWS", "500"))
+    
+    # Largest page of chat history messages per request
+    HISTORY_MAX_PAGE_SIZE: int = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "500"))
     
     # Application
     DEBUG: bool = os.getenv("DEBUG", "true").lower() == "true"
@@ -20,5 +48,73 @@ class Settings:
     # Provider timeouts
     PROVIDER_TIMEOUT: int = 30
     MAX_RETRIES: int = 2
+    PROVIDER_CONNECT_TIMEOUT: float = float(os.getenv("PROVIDER_CONNECT_TIMEOUT", "10"))
+    PROVIDER_MIN_CONNECT_TIMEOUT: float = float(os.getenv("PROVIDER_MIN_CONNECT_TIMEOUT", "2"))
+    PROVIDER_MIN_FIRST_TOKEN_TIMEOUT: float = float(os.getenv("PROVIDER_MIN_FIRST_TOKEN_TIMEOUT", "5"))
+    RETRY_BACKOFF: float = float(os.getenv("RETRY_BACKOFF", "0.25"))  # seconds, with full jitter
+
+    # Circuit breaker
+    CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RESET_TIMEOUT: float = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+
+    # Shared HTTP connection pools (one per provider)
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+    HTTP2_ENABLED: bool = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+    # Per-provider admission control; override per provider, e.g. GROQ_RPM=30
+    ADMISSION_MAX_CONCURRENCY: int = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "16"))
+    ADMISSION_RPM: float = float(os.getenv("ADMISSION_RPM", "0"))  # 0 means unlimited
+    ADMISSION_TPM: float = float(os.getenv("ADMISSION_TPM", "0"))  # 0 means unlimited
+    ADMISSION_MAX_QUEUE: int = int(os.getenv("ADMISSION_MAX_QUEUE", "100"))
+    ADMISSION_COMPLETION_TOKENS: int = int(os.getenv("ADMISSION_COMPLETION_TOKENS", "500"))
+
+    # Aggregate mode policy
+    AGGREGATE_DEADLINE: float = float(os.getenv("AGGREGATE_DEADLINE", "30"))  # seconds
+    AGGREGATE_QUORUM: int = int(os.getenv("AGGREGATE_QUORUM", "0"))  # 0 means all providers
+    AGGREGATE_EARLY_SYNTHESIS: bool = os.getenv("AGGREGATE_EARLY_SYNTHESIS", "false").lower() == "true"
+    AGGREGATE_STRAGGLERS: str = os.getenv("AGGREGATE_STRAGGLERS", "persist")  # persist or cancel
+
+    # Exact-match response cache
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_TTL: int = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))  # seconds
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+    RESPONSE_CACHE_MAX_BYTES: int = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+    # Coalesce identical in-flight provider requests
+    SINGLE_FLIGHT_ENABLED: bool = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+    # WebSocket token batching; a window of 0 sends every token as its own frame
+    WS_BATCH_WINDOW_MS: float = float(os.getenv("WS_BATCH_WINDOW_MS", "20"))
+    WS_BATCH_MAX_BYTES: int = int(os.getenv("WS_BATCH_MAX_BYTES", "1024"))
+    WS_PER_MESSAGE_DEFLATE: bool = os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower() == "true"
+    # Per-connection outbound queue; on overflow: drop_oldest, coalesce or disconnect
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+    WS_OVERFLOW_POLICY: str = os.getenv("WS_OVERFLOW_POLICY", "coalesce")
+    # Replay buffers for clients that reconnect with last_seq
+    WS_REPLAY_MAX_EVENTS: int = int(os.getenv("WS_REPLAY_MAX_EVENTS", "5000"))  # per chat
+    WS_REPLAY_TTL: float = float(os.getenv("WS_REPLAY_TTL", "300"))  # seconds since the chat's last event
+    WS_REPLAY_MAX_BYTES: int = int(os.getenv("WS_REPLAY_MAX_BYTES", str(32 * 1024 * 1024)))
+    SSE_HEARTBEAT_INTERVAL: float = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))  # seconds
+    # Cross-worker stream fan-out: empty for in-process, or redis://host:port
+    STREAM_PUBSUB_URL: str = os.getenv("STREAM_PUBSUB_URL", "")
+
+    # Artificial typing effect for the synthesized answer; 0 streams it as soon as it is ready
+    SYNTH_PACING_CHARS_PER_SEC: float = float(os.getenv("SYNTH_PACING_CHARS_PER_SEC", "0"))
+
+    # Single-mode routing: picks the provider with the best like ratio x (1 - error rate),
+    # less ROUTER_LATENCY_WEIGHT per second of expected time to first token
+    ROUTER_LATENCY_WEIGHT: float = float(os.getenv("ROUTER_LATENCY_WEIGHT", "0.1"))
+    ROUTER_EXPLORATION: float = float(os.getenv("ROUTER_EXPLORATION", "0.05"))  # share of requests routed at random
+    ROUTER_EWMA_ALPHA: float = float(os.getenv("ROUTER_EWMA_ALPHA", "0.2"))
+
+    # Near-duplicate prompt cache (aggregate mode); opt-in, as it answers from another chat
+    SIMILAR_PROMPT_CACHE_ENABLED: bool = os.getenv("SIMILAR_PROMPT_CACHE_ENABLED", "false").lower() == "true"
+    SIMILAR_PROMPT_THRESHOLD: float = float(os.getenv("SIMILAR_PROMPT_THRESHOLD", "0.85"))
+
+    def provider_limit(self, provider: str, key: str) -> float:
+        """Admission limit for a provider, e.g. GROQ_RPM, falling back to ADMISSION_RPM"""
+        return float(os.getenv(f"{provider.upper()}_{key}", getattr(self, f"ADMISSION_{key}")))
 
 settings = Settings()
\ No newline at end of file
@@ -1,20 +1,151 @@
+from typing import Optional
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from config import settings
 from backend.models import Base
 
-engine = create_async_engine(settings.DATABASE_URL, echo=settings.DEBUG)
+SYNCHRONOUS_MODES = {0: "off", 1: "normal", 2: "full", 3: "extra"}
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+def is_memory_db(url: str) -> bool:
+    return is_sqlite(url) and make_url(url).database in (None, "", ":memory:")
+
+def create_engine(url: str, pool_size: int, read_only: bool = False):
+    """An engine with its own connection pool, and SQLite pragmas set per connection"""
+    options = {"echo": settings.DB_ECHO}
+    if not is_memory_db(url):
+        # aiosqlite defaults to NullPool, opening a connection (and its thread) per session
+        options.update(
+            poolclass=AsyncAdaptedQueuePool, pool_size=pool_size, max_overflow=0,
+            pool_timeout=settings.DB_POOL_TIMEOUT
+        )
+    new_engine = create_async_engine(url, **options)
+
+    if is_sqlite(url):
+        @event.listens_for(new_engine.sync_engine, "connect")
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            # WAL lets readers run alongside the writer; it persists in the database file
+            cursor.execute(f"PRAGMA journal_mode={settings.DB_JOURNAL_MODE}")
+            cursor.execute(f"PRAGMA synchronous={settings.DB_SYNCHRONOUS}")
+            cursor.execute(f"PRAGMA busy_timeout={settings.DB_BUSY_TIMEOUT_MS}")
+            cursor.execute(f"PRAGMA cache_size=-{settings.DB_CACHE_SIZE_KB}")
+            cursor.execute(f"PRAGMA mmap_size={settings.DB_MMAP_SIZE}")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            if read_only:
+                cursor.execute("PRAGMA query_only=ON")
+            cursor.close()
+    return new_engine
+
+# Writes go through one pool, by default of a single connection: SQLite takes
+# one writer at a time, so more connections would only wait on its lock
+engine = create_engine(settings.DATABASE_URL, settings.DB_WRITE_POOL_SIZE)
 AsyncSessionLocal = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+# Reads (history, rating lookups, caches) never wait for a write connection.
+# An in-memory database exists per connection, so there it shares the writer's
+read_url = settings.DATABASE_READ_URL or settings.DATABASE_URL
+read_engine = engine if is_memory_db(read_url) else create_engine(read_url, settings.DB_READ_POOL_SIZE, read_only=True)
+ReadSessionLocal = sessionmaker(
+    read_engine, class_=AsyncSession, expire_on_commit=False
+)
+
+# Effective settings, as check_storage found them at startup
+storage_profile: dict = {}
+
+def add_missing_columns(connection):
+    """create_all skips tables that exist, so add columns introduced since
+
+    New columns are nullable without server defaults, which ADD COLUMN
+    accepts on every backend; existing rows read them as NULL.
+    """
+    inspector = inspect(connection)
+    quote = connection.dialect.identifier_preparer.quote
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.execute(text(
+                    f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}"
+                ))
+
+def create_indexes(connection):
+    """create_all skips tables that exist, so add indexes introduced since"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+def migrate(connection):
+    """Bring the schema up to date; safe to run on every start"""
+    Base.metadata.create_all(connection)
+    add_missing_columns(connection)
+    create_indexes(connection)
+
 async def init_db():
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(migrate)
+
+async def close_db():
+    """Close pooled connections; each aiosqlite connection runs a thread that would keep the process alive"""
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
+
+async def describe_engine(target) -> dict:
+    """Pool size and, for SQLite, the pragmas a connection actually ended up with"""
+    profile = {
+        "dialect": target.dialect.name,
+        "pool": type(target.pool).__name__,
+        "pool_size": target.pool.size() if hasattr(target.pool, "size") else None,
+        "echo": target.echo
+    }
+    if target.dialect.name == "sqlite":
+        async with target.connect() as conn:
+            for pragma in ["journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size", "query_only"]:
+                profile[pragma] = (await conn.execute(text(f"PRAGMA {pragma}"))).scalar()
+        profile["synchronous"] = SYNCHRONOUS_MODES.get(profile["synchronous"], profile["synchronous"])
+        profile["query_only"] = bool(profile["query_only"])
+    return profile
+
+async def check_storage() -> dict:
+    """Startup self-check: the effective storage settings, with what differs from the configuration"""
+    profile = {"write": await describe_engine(engine)}
+    if read_engine is not engine:
+        profile["read"] = await describe_engine(read_engine)
+
+    warnings = []
+    for name, found in profile.items():
+        journal_mode: Optional[str] = found.get("journal_mode")
+        # SQLite quietly keeps the old mode when it cannot switch, e.g. for in-memory databases
+        if journal_mode is not None and journal_mode.lower() != settings.DB_JOURNAL_MODE.lower():
+            warnings.append(f"{name}: journal_mode is {journal_mode}, not {settings.DB_JOURNAL_MODE}")
+    if "read" not in profile:
+        warnings.append("reads share the write pool")
+    profile["warnings"] = warnings
+
+    storage_profile.clear()
+    storage_profile.update(profile)
+    return profile
 
 async def get_db():
     async with AsyncSessionLocal() as session:
         try:
             yield session
         finally:
-            await session.close()
\ No newline at end of file
+            await session.close()
+
+async def get_read_db():
+    """Read-only session, for endpoints that only look data up"""
+    async with ReadSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
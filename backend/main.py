@@ -1,22 +1,50 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
+import asyncio
 import os
+import sys
 from contextlib import asynccontextmanager
 
 from config import settings
-from backend.db import init_db
-from backend.routers import chat, rating
-from backend.streaming.websocket import ConnectionManager
+from backend.db import init_db, check_storage, close_db
+from backend.routers import chat, rating, admin, metrics, stream
+from backend.providers.http_pool import http_pool
+from backend.providers.registry import provider_registry
+from backend.streaming.websocket import websocket_manager
+from backend.cache.similarity import similarity_index
+from backend.providers.routing import provider_router
+from backend.persistence import persistence
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Initialize database on startup
     await init_db()
+    # Report the pragmas and pools the database actually ended up with
+    storage = await check_storage()
+    for name in ["write", "read"]:
+        if name in storage:
+            print(f"Storage ({name}): " + ", ".join(f"{key}={value}" for key, value in storage[name].items()), file=sys.stderr)
+    for warning in storage["warnings"]:
+        print(f"Storage warning: {warning}", file=sys.stderr)
+    persistence.start()
+    if settings.SIMILAR_PROMPT_CACHE_ENABLED:
+        await similarity_index.load()
+    await provider_router.load()
+    # Join the cross-worker stream fan-out before serving clients
+    await websocket_manager.start()
+    # Import providers and open their connection pools without delaying startup
+    warmup = asyncio.create_task(provider_registry.warmup()) if settings.PROVIDER_WARMUP else None
     yield
     # Clean up on shutdown
-    pass
+    if warmup:
+        warmup.cancel()
+    await websocket_manager.close()
+    # Answers still queued are written before the process exits
+    await persistence.close()
+    await close_db()
+    await http_pool.close()
 
 app = FastAPI(
     title="Multi-AI Chat Platform",
@@ -34,12 +62,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# WebSocket manager
-websocket_manager = ConnectionManager()
-
 # Include routers
 app.include_router(chat.router, prefix="/api", tags=["chat"])
 app.include_router(rating.router, prefix="/api", tags=["rating"])
+app.include_router(admin.router, prefix="/api", tags=["admin"])
+app.include_router(metrics.router, tags=["metrics"])
+# WebSocket endpoint, sharing the manager the chat router streams through
+app.include_router(stream.router, tags=["stream"])
 
 # Serve frontend files
 if os.path.exists("frontend"):
@@ -56,17 +85,7 @@ if os.path.exists("frontend"):
             return FileResponse(frontend_path)
         return FileResponse("frontend/index.html")
 
-# WebSocket endpoint
-@app.websocket("/ws/chat/{chat_id}")
-async def websocket_endpoint(websocket: WebSocket, chat_id: str):
-    await websocket_manager.connect(websocket, chat_id)
-    try:
-        while True:
-            data = await websocket.receive_text()
-            # Handle incoming messages if needed
-    except WebSocketDisconnect:
-        websocket_manager.disconnect(websocket, chat_id)
-
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # permessage-deflate is negotiated with clients that offer it
+    uvicorn.run(app, host="0.0.0.0", port=8000, ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, Integer, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, String, Text, Integer, Float, Boolean, DateTime, ForeignKey, LargeBinary, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.dialects.sqlite import UUID
 import uuid
@@ -23,20 +23,46 @@ class Message(Base):
     is_user = Column(Boolean, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Chat history reads a chat's messages in (created_at, id) order
+    __table_args__ = (Index("ix_messages_chat_id_created_at", "chat_id", "created_at", "id"),)
+
 class ProviderResponse(Base):
     __tablename__ = "provider_responses"
     
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    message_id = Column(String(36), ForeignKey("messages.id"), nullable=False)
+    message_id = Column(String(36), ForeignKey("messages.id"), nullable=False, index=True)
     provider = Column(String(50), nullable=False)  # openai, groq, deepseek, gemini
     content = Column(Text, nullable=False)
     response_time = Column(Integer)  # in milliseconds
+    ttft = Column(Integer)  # time to first token, in milliseconds
+    token_count = Column(Integer)
+    tokens_per_sec = Column(Float)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 class Rating(Base):
     __tablename__ = "ratings"
     
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    message_id = Column(String(36), ForeignKey("messages.id"), nullable=False)
+    message_id = Column(String(36), ForeignKey("messages.id"), nullable=False, index=True)
     score = Column(Integer, nullable=False)  # 1 for like, -1 for dislike
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class CachedResponse(Base):
+    __tablename__ = "response_cache"
+    
+    key = Column(String(64), primary_key=True)  # sha256 of provider, model and prompt
+    provider = Column(String(50), nullable=False)
+    model = Column(String(100), nullable=False)
+    prompt = Column(Text, nullable=False)
+    tokens = Column(Text, nullable=False)  # JSON list, replayed token by token
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class PromptSignature(Base):
+    __tablename__ = "prompt_signatures"
+    
+    message_id = Column(String(36), ForeignKey("messages.id"), primary_key=True)  # user prompt
+    response_message_id = Column(String(36), ForeignKey("messages.id"), nullable=False)
+    signature = Column(LargeBinary, nullable=False)  # packed MinHash signature
     created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
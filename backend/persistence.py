@@ -0,0 +1,219 @@
+import asyncio
+import sys
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+from config import settings
+from backend.db import AsyncSessionLocal
+from backend.models import Base
+from backend.utils.metrics import metrics
+
+# Attempts per batch, e.g. while another process holds the SQLite write lock
+WRITE_ATTEMPTS = 3
+
+persistence_queue_depth = metrics.gauge(
+    "persistence_queue_depth", "Rows waiting for the write-behind writer"
+)
+persistence_lag = metrics.histogram(
+    "persistence_queue_lag_seconds", "Time from queueing a row to its commit"
+)
+persistence_batch_rows = metrics.histogram(
+    "persistence_batch_rows", "Rows committed per transaction", buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+persistence_rows = metrics.counter(
+    "persistence_rows_total", "Rows written by the write-behind writer", ["table", "outcome"]
+)
+
+class PersistenceQueue:
+    """Write-behind storage: a bounded queue and one writer task
+
+    Callers get their row's values, including the generated id, as soon as
+    it is queued. The writer drains everything queued while it was busy and
+    commits it in one transaction, one bulk INSERT per table, so concurrent
+    answers do not contend for the database's write lock.
+
+    Readers wait only for the rows they are about to read: each row is
+    pending under its id and the keys it was added with, e.g. its chat,
+    until it is written.
+    """
+
+    def __init__(self, max_size: int, batch_rows: int):
+        self.max_size = max_size
+        self.batch_rows = batch_rows
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queued = 0
+        self._written = 0
+        self._waiters: List[Tuple[int, asyncio.Future]] = []
+        # Unwritten rows per key, and flush(key) calls waiting for them
+        self._pending: Dict[str, int] = {}
+        self._key_waiters: Dict[str, List[asyncio.Future]] = {}
+        self.failed = 0
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        """Start the writer on the running loop; adding a row starts it too"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # A new event loop, e.g. per test; the old queue belongs to the old one
+            self._loop = loop
+            self._queue = asyncio.Queue(self.max_size)
+            self._queued = self._written = 0
+            self._waiters = []
+            self._pending = {}
+            self._key_waiters = {}
+            self._task = None
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    @staticmethod
+    def _with_defaults(model, values: dict) -> dict:
+        # Fill client-side defaults now: callers need the id, and created_at
+        # should be when the row was produced, not when it was written
+        for column in model.__table__.columns:
+            if column.name in values or column.default is None:
+                continue
+            if column.default.is_callable:
+                values[column.name] = column.default.arg(None)
+            elif column.default.is_scalar:
+                values[column.name] = column.default.arg
+        return values
+
+    async def add(self, model, keys: Sequence[str] = (), **values) -> dict:
+        """Queue a row for insertion, waiting while the queue is full
+
+        flush(key) waits for the row under its id and each of keys.
+        """
+        self.start()
+        row = self._with_defaults(model, values)
+        row_keys = tuple({key for key in (row.get("id"), *keys) if key is not None})
+        await self._queue.put((model.__table__, row, time.perf_counter(), row_keys))
+        # Counted once queued: a caller cancelled while the queue is full
+        # never queues its row, and must not leave flush(key) waiting for it.
+        # The writer cannot run before this, as nothing awaits in between.
+        for key in row_keys:
+            self._pending[key] = self._pending.get(key, 0) + 1
+        self._queued += 1
+        persistence_queue_depth.set(self._queue.qsize())
+        return row
+
+    async def flush(self, key: Optional[str] = None):
+        """Wait until the rows queued under key, or every row queued so far, are written"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            return
+        if key is not None:
+            if not self._pending.get(key):
+                return
+            waiter = loop.create_future()
+            self._key_waiters.setdefault(key, []).append(waiter)
+            await waiter
+            return
+        if self._written >= self._queued:
+            return
+        waiter = loop.create_future()
+        self._waiters.append((self._queued, waiter))
+        await waiter
+
+    async def close(self):
+        """Write what is queued, then stop the writer"""
+        if self._task is None or self._loop is not asyncio.get_running_loop():
+            return
+        await self.flush()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self):
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            # Everything that arrived during the last write goes in this one
+            while len(batch) < self.batch_rows and not queue.empty():
+                batch.append(queue.get_nowait())
+            persistence_queue_depth.set(queue.qsize())
+            await self._write(batch)
+            self._written += len(batch)
+            self._wake(batch)
+
+    @staticmethod
+    def _groups(batch: list) -> List[list]:
+        """Rows per INSERT: parents before children, and the same keys per executemany"""
+        order = {table: i for i, table in enumerate(Base.metadata.sorted_tables)}
+        groups: Dict[tuple, list] = {}
+        for item in batch:
+            table, row = item[0], item[1]
+            groups.setdefault((order[table], table.name, tuple(sorted(row))), []).append(item)
+        return [groups[key] for key in sorted(groups)]
+
+    async def _commit(self, groups: List[list]) -> Optional[Exception]:
+        """Insert the groups in one transaction; the error if it did not commit"""
+        for attempt in range(WRITE_ATTEMPTS):
+            try:
+                async with AsyncSessionLocal() as db:
+                    for group in groups:
+                        await db.execute(insert(group[0][0]), [row for _, row, _, _ in group])
+                    await db.commit()
+                return None
+            except Exception as e:
+                self.last_error = str(e)
+                # Lock timeouts are worth retrying; anything else would fail the same way
+                if not isinstance(e, OperationalError) or attempt + 1 == WRITE_ATTEMPTS:
+                    return e
+                await asyncio.sleep(0.1 * 2 ** attempt)
+
+    async def _write(self, batch: list):
+        groups = self._groups(batch)
+        error = await self._commit(groups)
+        if error is None:
+            now = time.perf_counter()
+            persistence_batch_rows.observe(len(batch))
+            for table, _, queued_at, _ in batch:
+                persistence_lag.observe(now - queued_at)
+                persistence_rows.inc(table=table.name, outcome="written")
+            return
+
+        # A bad row fails its whole transaction; split the batch, first per
+        # INSERT, then per row, so only the offending rows are lost. Lock
+        # timeouts would only fail again, so the batch fails as a whole.
+        if len(batch) > 1 and not isinstance(error, OperationalError):
+            for part in groups if len(groups) > 1 else [[item] for item in batch]:
+                await self._write(part)
+            return
+
+        self.failed += len(batch)
+        for table, row, _, _ in batch:
+            persistence_rows.inc(table=table.name, outcome="failed")
+            print(f"Persistence: dropped {table.name} row {row.get('id')}: {error}", file=sys.stderr)
+
+    def _wake(self, batch: list):
+        for _, _, _, row_keys in batch:
+            for key in row_keys:
+                self._pending[key] -= 1
+                if not self._pending[key]:
+                    del self._pending[key]
+                    for waiter in self._key_waiters.pop(key, []):
+                        if not waiter.done():
+                            waiter.set_result(None)
+
+        pending = []
+        for target, waiter in self._waiters:
+            if target <= self._written:
+                if not waiter.done():
+                    waiter.set_result(None)
+            else:
+                pending.append((target, waiter))
+        self._waiters = pending
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_size": self.max_size,
+            "written": self._written,
+            "failed": self.failed,
+            "last_error": self.last_error
+        }
+
+persistence = PersistenceQueue(settings.PERSIST_QUEUE_SIZE, settings.PERSIST_BATCH_ROWS)
@@ -0,0 +1,182 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from typing import AsyncGenerator, List, Optional, Tuple
+from config import settings
+from backend.providers.base import ProviderClient
+from backend.utils.errors import ProviderError
+from backend.utils.metrics import metrics
+
+# Lower is served first; set per request before fanning out to providers
+request_priority: contextvars.ContextVar = contextvars.ContextVar("request_priority", default=1)
+
+admission_wait = metrics.histogram(
+    "admission_queue_wait_seconds", "Time spent queued before a provider slot", ["provider"]
+)
+admission_rejected = metrics.counter(
+    "admission_rejected_total", "Requests rejected because the queue was full", ["provider"]
+)
+
+class TokenBucket:
+    """Refills continuously at `per_minute`; a rate of 0 means unlimited"""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        if not self.rate:
+            return 0.0
+        self._refill()
+        # Requests larger than the bucket only wait for a full bucket
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def consume(self, amount: float):
+        if self.rate:
+            self._refill()
+            self.tokens -= amount
+
+class AdmissionController:
+    """Concurrency slots, RPM/TPM token buckets and a bounded priority queue"""
+
+    def __init__(self, name: str, max_concurrency: int, rpm: float, tpm: float, max_queue: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.active = 0
+        # (priority, arrival order, estimated tokens, future)
+        self._queue: List[Tuple[int, int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.service_time = 1.0  # EWMA of how long a request holds a slot
+
+    def estimated_wait(self) -> float:
+        """Rough queue wait for a request arriving now"""
+        ahead = len(self._queue) + max(0, self.active - self.max_concurrency + 1)
+        slot_wait = ahead * self.service_time / max(1, self.max_concurrency)
+        return max(slot_wait, self.requests.time_until(len(self._queue) + 1))
+
+    def _dispatch(self):
+        self._timer = None
+        while self._queue and self.active < self.max_concurrency:
+            _, _, estimate, future = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            wait = max(self.requests.time_until(1), self.tokens.time_until(estimate))
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._queue)
+            self.active += 1
+            self.requests.consume(1)
+            self.tokens.consume(estimate)
+            future.set_result(None)
+
+    async def acquire(self, estimate: int, priority: int = 1):
+        if len(self._queue) >= self.max_queue:
+            admission_rejected.inc(provider=self.name)
+            raise ProviderError(self.name, "Too many queued requests", 429)
+
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._order), estimate, future)
+        heapq.heappush(self._queue, entry)
+        if self._timer is None:
+            self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as we were cancelled; hand the slot back
+                self.release(started, estimate, estimate)
+            elif entry in self._queue:
+                # Behind a rate-limited head it would count as queued for a long time
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+            raise
+        admission_wait.observe(time.monotonic() - started, provider=self.name)
+
+    def release(self, admitted_at: float, estimate: int, used: int):
+        self.active -= 1
+        # Charge the difference between the estimate and what was actually used
+        self.tokens.consume(used - estimate)
+        held = time.monotonic() - admitted_at
+        self.service_time += 0.2 * (held - self.service_time)
+        if self._timer is None:
+            self._dispatch()
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": len(self._queue),
+            "max_concurrency": self.max_concurrency,
+            "estimated_wait": self.estimated_wait(),
+            "service_time": self.service_time
+        }
+
+def estimate_tokens(prompt: str) -> int:
+    # About four characters per token, plus the expected completion
+    return len(prompt) // 4 + settings.ADMISSION_COMPLETION_TOKENS
+
+class AdmittedProvider(ProviderClient):
+    """Runs a provider's streams through its admission controller"""
+
+    def __init__(self, provider: ProviderClient):
+        self.provider = provider
+        name = provider.get_name()
+        self.admission = AdmissionController(
+            name,
+            max_concurrency=int(settings.provider_limit(name, "MAX_CONCURRENCY")),
+            rpm=settings.provider_limit(name, "RPM"),
+            tpm=settings.provider_limit(name, "TPM"),
+            max_queue=int(settings.provider_limit(name, "MAX_QUEUE"))
+        )
+
+    @property
+    def http_pooled(self) -> bool:
+        return self.provider.http_pooled
+
+    @property
+    def model(self) -> str:
+        return self.provider.model
+
+    def is_configured(self) -> bool:
+        return self.provider.is_configured()
+
+    def get_name(self) -> str:
+        return self.provider.get_name()
+
+    def is_available(self) -> bool:
+        return self.provider.is_available()
+
+    def estimated_wait(self) -> float:
+        return self.admission.estimated_wait()
+
+    def health(self) -> dict:
+        health = self.provider.health() if hasattr(self.provider, "health") else {}
+        return {**health, "admission": self.admission.stats()}
+
+    async def generate(self, prompt: str) -> AsyncGenerator[str, None]:
+        estimate = estimate_tokens(prompt)
+        await self.admission.acquire(estimate, request_priority.get())
+        admitted_at = time.monotonic()
+        used = len(prompt) // 4
+        try:
+            async for token in self.provider.generate(prompt):
+                used += 1
+                yield token
+        finally:
+            self.admission.release(admitted_at, estimate, used)
@@ -1,7 +1,16 @@
 from abc import ABC, abstractmethod
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
+import httpx
+from config import settings
 
 class ProviderClient(ABC):
+    # Whether the provider streams through the shared `http_pool` clients
+    http_pooled: bool = False
+    # Upstream model name, part of the response cache key
+    model: str = ""
+    # Connect timeout in seconds, adapted per provider by the resilience layer
+    connect_timeout: Optional[float] = None
+    
     @abstractmethod
     async def generate(self, prompt: str) -> AsyncGenerator[str, None]:
         pass
@@ -12,4 +21,18 @@ class ProviderClient(ABC):
     
     @abstractmethod
     def get_name(self) -> str:
-        pass
\ No newline at end of file
+        pass
+    
+    def is_available(self) -> bool:
+        """Whether the provider should take part in fan-out right now"""
+        return True
+    
+    def estimated_wait(self) -> float:
+        """Expected queueing delay in seconds before a request would start"""
+        return 0.0
+    
+    def request_timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            settings.PROVIDER_TIMEOUT,
+            connect=self.connect_timeout or settings.PROVIDER_CONNECT_TIMEOUT
+        )
\ No newline at end of file
@@ -1,13 +1,17 @@
 
-import google.generativeai as genai
 from typing import AsyncGenerator
 from config import settings
 from backend.providers.base import ProviderClient
+from backend.utils.errors import ProviderError
 
 class GeminiProvider(ProviderClient):
+    model = "gemini-pro"
+    
     def __init__(self):
         self.client = None
         if settings.GEMINI_API_KEY:
+            # Imported here so the SDK is only loaded when Gemini is actually used
+            import google.generativeai as genai
             genai.configure(api_key=settings.GEMINI_API_KEY)
             self.client = genai
     
@@ -22,11 +26,11 @@ class GeminiProvider(ProviderClient):
             raise Exception("Gemini client not configured")
         
         try:
-            model = self.client.GenerativeModel('gemini-pro')
+            model = self.client.GenerativeModel(self.model)
             response = await model.generate_content_async(prompt, stream=True)
             
             async for chunk in response:
                 yield chunk.text
                 
         except Exception as e:
-            yield f"Error: {str(e)}"
\ No newline at end of file
+            raise ProviderError(self.get_name(), str(e))
\ No newline at end of file
@@ -0,0 +1,71 @@
+import importlib.util
+from typing import Dict, Iterable
+import httpx
+from config import settings
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional `h2` package"""
+    return importlib.util.find_spec("h2") is not None
+
+class HTTPClientPool:
+    """One long-lived httpx client (and connection pool) per provider"""
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._requests: Dict[str, int] = {}
+        self.http2 = settings.HTTP2_ENABLED and _http2_available()
+
+    def _build_client(self, name: str) -> httpx.AsyncClient:
+        async def count_request(request: httpx.Request):
+            self._requests[name] = self._requests.get(name, 0) + 1
+
+        return httpx.AsyncClient(
+            http2=self.http2,
+            timeout=httpx.Timeout(settings.PROVIDER_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+            ),
+            event_hooks={"request": [count_request]}
+        )
+
+    def get_client(self, name: str) -> httpx.AsyncClient:
+        """Return the provider's shared client, creating it on first use"""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._build_client(name)
+            self._clients[name] = client
+        return client
+
+    async def open(self, names: Iterable[str]):
+        """Create clients up front so the first request does not pay for it"""
+        for name in names:
+            self.get_client(name)
+
+    async def close(self):
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+    def stats(self) -> Dict[str, dict]:
+        """Per-provider connection pool statistics"""
+        stats = {}
+        for name, client in self._clients.items():
+            # httpx does not expose pool state publicly; read it from httpcore
+            pool = getattr(client._transport, "_pool", None)
+            connections = list(getattr(pool, "connections", []))
+            idle = sum(1 for conn in connections if conn.is_idle())
+            stats[name] = {
+                "http2": self.http2,
+                "requests": self._requests.get(name, 0),
+                "connections": len(connections),
+                "idle_connections": idle,
+                "active_connections": len(connections) - idle,
+                "max_connections": settings.HTTP_MAX_CONNECTIONS,
+                "max_keepalive_connections": settings.HTTP_MAX_KEEPALIVE_CONNECTIONS
+            }
+        return stats
+
+http_pool = HTTPClientPool()
@@ -0,0 +1,159 @@
+"""Local stand-in for OpenAI-compatible upstreams, for offline benchmarks and tests
+
+Run it and point the providers at it:
+
+    python -m backend.providers.mock_upstream --port 9100 --ttft 0.3 --tokens-per-sec 40
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 DEEPSEEK_BASE_URL=http://127.0.0.1:9100/v1 ...
+
+Every option can also be overridden per request with an `X-Mock-<Option>` header,
+e.g. `X-Mock-Error-Rate: 1`.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import AsyncGenerator, Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = [
+    "the", "model", "response", "stream", "token", "latency", "provider", "answer",
+    "context", "quality", "first", "second", "finally", "because", "network", "result"
+]
+
+class MockUpstreamConfig:
+    def __init__(
+        self,
+        ttft: float = 0.2,  # seconds before the first token
+        tokens_per_sec: float = 50,  # 0 streams as fast as possible
+        tokens: int = 100,  # completion length in tokens
+        token_size: int = 1,  # words per token, to vary payload size
+        error_rate: float = 0.0,  # share of requests rejected up front
+        error_status: int = 500,
+        midstream_error_rate: float = 0.0,  # share of streams cut off halfway
+        stall_rate: float = 0.0,  # share of streams that stall once
+        stall_seconds: float = 5.0,
+        keepalive_interval: float = 1.0,  # SSE comments sent while stalling
+        seed: Optional[int] = None
+    ):
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.tokens = tokens
+        self.token_size = token_size
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.midstream_error_rate = midstream_error_rate
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.keepalive_interval = keepalive_interval
+        self.seed = seed
+
+    def override(self, request: Request) -> "MockUpstreamConfig":
+        """Apply `X-Mock-*` request headers on top of this config"""
+        values = dict(vars(self))
+        for name, value in values.items():
+            header = request.headers.get("x-mock-" + name.replace("_", "-"))
+            if header is not None:
+                values[name] = int(header) if name in ["tokens", "token_size", "error_status", "seed"] else float(header)
+        return MockUpstreamConfig(**values)
+
+def _chunk(model: str, delta: dict, finish_reason: Optional[str] = None) -> str:
+    payload = {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+async def _sleep_with_keepalive(seconds: float, interval: float) -> AsyncGenerator[str, None]:
+    deadline = time.monotonic() + seconds
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        await asyncio.sleep(min(remaining, interval))
+        if deadline - time.monotonic() > 0:
+            yield ": keep-alive\n\n"
+
+async def _stream(config: MockUpstreamConfig, model: str, rng: random.Random) -> AsyncGenerator[str, None]:
+    await asyncio.sleep(config.ttft)
+    yield _chunk(model, {"role": "assistant", "content": ""})
+
+    stall_at = rng.randrange(config.tokens) if config.tokens and rng.random() < config.stall_rate else -1
+    fail_at = config.tokens // 2 if rng.random() < config.midstream_error_rate else -1
+    interval = 1 / config.tokens_per_sec if config.tokens_per_sec else 0
+    started = time.monotonic()
+    for i in range(config.tokens):
+        if i == fail_at:
+            yield f"data: {json.dumps({'error': {'message': 'mock upstream failure', 'type': 'server_error'}})}\n\n"
+            return
+        if i == stall_at:
+            async for keepalive in _sleep_with_keepalive(config.stall_seconds, config.keepalive_interval):
+                yield keepalive
+            started += config.stall_seconds
+        # Pace against the start time so sleep overhead does not accumulate
+        delay = started + i * interval - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        text = " ".join(rng.choice(WORDS) for _ in range(config.token_size))
+        yield _chunk(model, {"content": text + " "})
+
+    yield _chunk(model, {}, "stop")
+    yield "data: [DONE]\n\n"
+
+def create_app(config: Optional[MockUpstreamConfig] = None) -> FastAPI:
+    config = config or MockUpstreamConfig()
+    app = FastAPI(title="Mock OpenAI-compatible upstream")
+    seeds = random.Random(config.seed)
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        request_config = config.override(request)
+        rng = random.Random(request_config.seed if request_config.seed is not None else seeds.random())
+        model = body.get("model", "mock")
+
+        if rng.random() < request_config.error_rate:
+            return JSONResponse(
+                {"error": {"message": "mock upstream error", "type": "server_error"}},
+                status_code=request_config.error_status
+            )
+        if not body.get("stream"):
+            await asyncio.sleep(request_config.ttft)
+            content = " ".join(rng.choice(WORDS) for _ in range(request_config.tokens * request_config.token_size))
+            return {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }]
+            }
+        return StreamingResponse(_stream(request_config, model, rng), media_type="text/event-stream")
+
+    # OpenAI/DeepSeek style paths, and Groq's /openai/v1 prefix
+    app.add_api_route("/v1/chat/completions", chat_completions, methods=["POST"])
+    app.add_api_route("/openai/v1/chat/completions", chat_completions, methods=["POST"])
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    defaults = MockUpstreamConfig()
+    for name, value in vars(defaults).items():
+        parser.add_argument("--" + name.replace("_", "-"), type=int if name == "seed" else type(value),
+                            default=value)
+    args = vars(parser.parse_args())
+    host, port = args.pop("host"), args.pop("port")
+
+    import uvicorn
+    uvicorn.run(create_app(MockUpstreamConfig(**args)), host=host, port=port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import json
+from typing import AsyncGenerator, Optional
+from backend.providers.base import ProviderClient
+from backend.providers.http_pool import http_pool
+from backend.utils.errors import ProviderError
+from backend.utils.sse import SSEDecoder
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+class OpenAICompatibleProvider(ProviderClient):
+    """Streaming chat completions against any OpenAI-compatible API
+
+    Chunks are decoded straight from the response bytes into plain dicts; no
+    SDK model objects are built per chunk. Subclasses only set the name,
+    model, key and base URL.
+    """
+
+    http_pooled = True
+    name = ""
+    chat_path = "/chat/completions"
+
+    def __init__(self, api_key: Optional[str], base_url: str):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    def get_name(self) -> str:
+        return self.name
+
+    def _content(self, data: str) -> Optional[str]:
+        chunk = _loads(data)
+        # Valid JSON need not be an object; such lines carry nothing to show
+        if not isinstance(chunk, dict):
+            return None
+        choices = chunk.get("choices")
+        if choices:
+            # Likewise for each level below it
+            choice = choices[0] if isinstance(choices, list) else None
+            delta = choice.get("delta") if isinstance(choice, dict) else None
+            content = delta.get("content") if isinstance(delta, dict) else None
+            return content if isinstance(content, str) else None
+        if "error" in chunk:
+            error = chunk["error"]
+            message = error.get("message", str(error)) if isinstance(error, dict) else str(error)
+            raise ProviderError(self.name, message)
+        return None
+
+    async def generate(self, prompt: str) -> AsyncGenerator[str, None]:
+        if not self.is_configured():
+            raise ProviderError(self.name, f"{self.name} API key not configured", 401)
+
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        data = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": True
+        }
+
+        client = http_pool.get_client(self.name)
+        async with client.stream("POST", self.base_url + self.chat_path, json=data,
+                                 headers=headers, timeout=self.request_timeout()) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                raise ProviderError(self.name, response.text, response.status_code)
+
+            decoder = SSEDecoder()
+            async for raw in response.aiter_bytes():
+                for event in decoder.feed(raw):
+                    if event == "[DONE]":
+                        return
+                    try:
+                        content = self._content(event)
+                    except ValueError:
+                        continue
+                    if content:
+                        yield content
@@ -0,0 +1,135 @@
+import asyncio
+import importlib
+import sys
+import time
+from collections.abc import Mapping
+from importlib.metadata import entry_points
+from typing import Dict, Iterator, List
+from config import settings
+from backend.providers.base import ProviderClient
+from backend.providers.stubs import StubProvider
+from backend.providers.resilience import ResilientProvider
+from backend.providers.admission import AdmittedProvider
+from backend.providers.http_pool import http_pool
+from backend.utils.metrics import metrics
+
+ENTRY_POINT_GROUP = "ai_fusion_chat.providers"
+
+BUILTIN_PROVIDERS = {
+    "openai": "backend.providers.openai:OpenAIProvider",
+    "groq": "backend.providers.groq:GroqProvider",
+    "deepseek": "backend.providers.deepseek:DeepSeekProvider",
+    "gemini": "backend.providers.gemini:GeminiProvider"
+}
+
+provider_load_seconds = metrics.histogram(
+    "provider_load_seconds", "Provider module import and construction time", ["provider", "phase"]
+)
+
+def _entry_points():
+    if sys.version_info >= (3, 10):
+        return entry_points(group=ENTRY_POINT_GROUP)
+    # Python < 3.10 takes no arguments and returns a dict of groups
+    return entry_points().get(ENTRY_POINT_GROUP, [])
+
+def provider_specs() -> Dict[str, str]:
+    """Enabled providers as name -> "module:Class", in PROVIDERS order
+
+    Entries are either a bare name (a built-in or an entry point in the
+    `ai_fusion_chat.providers` group) or an explicit `name=module:Class`.
+    """
+    known = dict(BUILTIN_PROVIDERS)
+    for entry_point in _entry_points():
+        known.setdefault(entry_point.name, entry_point.value)
+
+    specs = {}
+    for entry in settings.PROVIDERS.split(","):
+        name, _, spec = entry.strip().partition("=")
+        if not name:
+            continue
+        spec = spec.strip() or known.get(name)
+        if spec:
+            specs[name] = spec
+    return specs
+
+class ProviderRegistry(Mapping):
+    """Providers by name, imported and constructed on first access
+
+    A provider whose module fails to import or whose constructor raises is
+    replaced by a stub, so one broken SDK does not take the app down.
+    """
+
+    def __init__(self, specs: Dict[str, str]):
+        self.specs = specs
+        self._providers: Dict[str, ProviderClient] = {}
+        self.load_stats: Dict[str, dict] = {}
+
+    def __getitem__(self, name: str) -> ProviderClient:
+        provider = self._providers.get(name)
+        if provider is None:
+            if name not in self.specs:
+                raise KeyError(name)
+            provider = self._providers[name] = self._load(name)
+        return provider
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.specs)
+
+    def __len__(self) -> int:
+        return len(self.specs)
+
+    def loaded(self) -> List[str]:
+        return list(self._providers)
+
+    def _import(self, name: str):
+        """Import a provider's module, timing the first attempt"""
+        module_name = self.specs[name].partition(":")[0]
+        stats = self.load_stats.setdefault(name, {"import_seconds": None, "init_seconds": None, "status": "pending"})
+        if stats["import_seconds"] is not None:
+            return importlib.import_module(module_name)
+        started = time.perf_counter()
+        try:
+            return importlib.import_module(module_name)
+        finally:
+            stats["import_seconds"] = time.perf_counter() - started
+            provider_load_seconds.observe(stats["import_seconds"], provider=name, phase="import")
+
+    def _load(self, name: str) -> ProviderClient:
+        class_name = self.specs[name].partition(":")[2]
+        try:
+            module = self._import(name)
+            stats = self.load_stats[name]
+            started = time.perf_counter()
+            try:
+                provider = getattr(module, class_name)()
+            finally:
+                stats["init_seconds"] = time.perf_counter() - started
+                provider_load_seconds.observe(stats["init_seconds"], provider=name, phase="init")
+        except Exception as e:
+            stats = self.load_stats[name]
+            stats["status"] = "failed"
+            stats["error"] = f"{type(e).__name__}: {e}"
+            return StubProvider(name)
+
+        # Fallback to stubs if no API keys
+        if not provider.is_configured():
+            stats["status"] = "stub"
+            return StubProvider(name)
+        stats["status"] = "active"
+        return AdmittedProvider(ResilientProvider(provider))
+
+    async def warmup(self):
+        """Import every provider off the event loop, then build it and open its pool"""
+        for name in self.specs:
+            if name in self._providers:
+                continue
+            try:
+                # Imports are the slow part; keep them off the event loop
+                await asyncio.get_running_loop().run_in_executor(None, self._import, name)
+            except Exception:
+                pass  # _load records the failure and falls back to a stub
+            provider = self[name]
+            if provider.http_pooled:
+                await http_pool.open([name])
+
+provider_registry = ProviderRegistry(provider_specs())
@@ -0,0 +1,178 @@
+import asyncio
+import math
+import random
+import time
+from typing import AsyncGenerator, Optional
+from config import settings
+from backend.providers.base import ProviderClient
+from backend.utils.errors import ProviderError
+
+class LatencyTracker:
+    """Exponentially weighted mean and variance of time-to-first-token"""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.mean: Optional[float] = None
+        self.variance = 0.0
+        self.samples = 0
+
+    def record(self, seconds: float):
+        self.samples += 1
+        if self.mean is None:
+            self.mean = seconds
+            return
+        diff = seconds - self.mean
+        self.mean += self.alpha * diff
+        self.variance = (1 - self.alpha) * (self.variance + self.alpha * diff * diff)
+
+    def first_token_timeout(self) -> float:
+        """Time budget for the first token: a few deviations above the mean"""
+        if self.mean is None:
+            return settings.PROVIDER_TIMEOUT
+        budget = self.mean + 4 * math.sqrt(self.variance) + 1
+        return min(max(budget, settings.PROVIDER_MIN_FIRST_TOKEN_TIMEOUT), settings.PROVIDER_TIMEOUT)
+
+    def connect_timeout(self) -> float:
+        """Connecting can never take longer than the first token does"""
+        if self.mean is None:
+            return settings.PROVIDER_CONNECT_TIMEOUT
+        budget = self.first_token_timeout() / 2
+        return min(max(budget, settings.PROVIDER_MIN_CONNECT_TIMEOUT), settings.PROVIDER_CONNECT_TIMEOUT)
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open probe -> closed"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+    def is_available(self) -> bool:
+        """Whether a request would be let through, without claiming the probe"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return time.monotonic() - self.opened_at >= self.reset_timeout
+        return not self.probe_in_flight
+
+    def allow_request(self) -> bool:
+        if not self.is_available():
+            return False
+        if self.state != self.CLOSED:
+            # Let a single probe through to test the provider
+            self.state = self.HALF_OPEN
+            self.probe_in_flight = True
+        return True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+        self.probe_in_flight = False
+
+    def release(self):
+        """The request was abandoned by the caller; it says nothing about health"""
+        self.probe_in_flight = False
+
+def _is_retryable(error: Exception) -> bool:
+    # Client errors other than timeouts and rate limits will fail again
+    if isinstance(error, ProviderError):
+        return not (400 <= error.status_code < 500) or error.status_code in [408, 429]
+    return True
+
+class ResilientProvider(ProviderClient):
+    """Adaptive timeouts, retries and a circuit breaker around a provider"""
+
+    def __init__(self, provider: ProviderClient):
+        self.provider = provider
+        self.latency = LatencyTracker()
+        self.breaker = CircuitBreaker(
+            settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_RESET_TIMEOUT
+        )
+
+    @property
+    def http_pooled(self) -> bool:
+        return self.provider.http_pooled
+
+    @property
+    def model(self) -> str:
+        return self.provider.model
+
+    def is_configured(self) -> bool:
+        return self.provider.is_configured()
+
+    def get_name(self) -> str:
+        return self.provider.get_name()
+
+    def is_available(self) -> bool:
+        return self.breaker.is_available()
+
+    def health(self) -> dict:
+        return {
+            "state": self.breaker.state,
+            "failures": self.breaker.failures,
+            "ttft_mean": self.latency.mean,
+            "connect_timeout": self.latency.connect_timeout(),
+            "first_token_timeout": self.latency.first_token_timeout()
+        }
+
+    async def generate(self, prompt: str) -> AsyncGenerator[str, None]:
+        if not self.breaker.allow_request():
+            raise ProviderError(self.get_name(), "Circuit open, provider temporarily disabled", 503)
+
+        loop = asyncio.get_running_loop()
+        for attempt in range(settings.MAX_RETRIES + 1):
+            self.provider.connect_timeout = self.latency.connect_timeout()
+            stream = self.provider.generate(prompt)
+            started = loop.time()
+            try:
+                first_token = await asyncio.wait_for(
+                    stream.__anext__(), timeout=self.latency.first_token_timeout()
+                )
+            except StopAsyncIteration:
+                self.breaker.record_success()
+                return
+            except asyncio.CancelledError:
+                self.breaker.release()
+                await stream.aclose()
+                raise
+            except Exception as e:
+                await stream.aclose()
+                if attempt < settings.MAX_RETRIES and _is_retryable(e):
+                    # Nothing reached the client yet, so retrying is invisible
+                    await asyncio.sleep(random.uniform(0, settings.RETRY_BACKOFF * 2 ** attempt))
+                    continue
+                self.breaker.record_failure()
+                if isinstance(e, asyncio.TimeoutError):
+                    raise ProviderError(self.get_name(), "Timed out waiting for the first token", 504)
+                raise
+            break
+
+        self.latency.record(loop.time() - started)
+        try:
+            yield first_token
+            async for token in stream:
+                yield token
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled straggler or a consumer that stopped reading
+            self.breaker.release()
+            raise
+        finally:
+            await stream.aclose()
+        self.breaker.record_success()
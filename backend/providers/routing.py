@@ -0,0 +1,145 @@
+import random
+from typing import Dict, Iterable, Mapping, Optional
+from sqlalchemy import func, select
+from config import settings
+from backend.db import ReadSessionLocal
+from backend.models import ProviderResponse, Rating
+from backend.providers.base import ProviderClient
+from backend.utils.metrics import StreamMetrics, metrics
+
+# Recent responses per provider replayed into the averages at startup
+WARM_START_RESPONSES = 50
+ERROR_PREFIX = "Error from "
+
+routed_requests = metrics.counter(
+    "provider_routed_requests_total", "Single-mode requests by routed provider", ["provider", "reason"]
+)
+
+class ProviderStats:
+    """Running per-provider averages, updated as responses and ratings come in"""
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.ttft: Optional[float] = None  # seconds, EWMA
+        self.error_rate = 0.0  # EWMA of failed requests
+        self.requests = 0
+        self.likes = 0
+        self.dislikes = 0
+
+    def record(self, ttft: Optional[float], failed: bool):
+        self.requests += 1
+        self.error_rate += self.alpha * (float(failed) - self.error_rate)
+        if ttft is not None:
+            self.ttft = ttft if self.ttft is None else self.ttft + self.alpha * (ttft - self.ttft)
+
+    def rate(self, score: int, change: int = 1):
+        if score > 0:
+            self.likes += change
+        elif score < 0:
+            self.dislikes += change
+
+    @property
+    def like_ratio(self) -> float:
+        """Share of likes, starting from an even prior"""
+        return (self.likes + 1) / (self.likes + self.dislikes + 2)
+
+    def utility(self, latency_weight: float, wait: float = 0.0) -> float:
+        """Expected quality of an answer, less a cost per second until its first token
+
+        Providers that have not answered yet are assumed fast and reliable,
+        so each gets tried.
+        """
+        latency = (self.ttft or 0.0) + wait
+        return self.like_ratio * (1 - self.error_rate) - latency_weight * latency
+
+    def to_dict(self) -> dict:
+        return {
+            "ttft": self.ttft,
+            "error_rate": self.error_rate,
+            "requests": self.requests,
+            "likes": self.likes,
+            "dislikes": self.dislikes,
+            "like_ratio": self.like_ratio
+        }
+
+class ProviderRouter:
+    """Picks the provider for single-mode requests from in-memory statistics
+
+    Statistics are loaded once at startup and then updated per response and
+    rating; choosing never touches the database. A small fraction of requests
+    goes to another provider so its statistics stay current.
+    """
+
+    def __init__(self, latency_weight: float, exploration: float, alpha: float):
+        self.latency_weight = latency_weight
+        self.exploration = exploration
+        self.alpha = alpha
+        self.stats: Dict[str, ProviderStats] = {}
+        self.loaded = False
+
+    def _stats(self, provider: str) -> ProviderStats:
+        stats = self.stats.get(provider)
+        if stats is None:
+            stats = self.stats[provider] = ProviderStats(self.alpha)
+        return stats
+
+    def choose(self, providers: Mapping[str, ProviderClient]) -> Optional[str]:
+        """Best available provider, or now and then a random other one"""
+        candidates = {name: provider for name, provider in providers.items() if provider.is_available()}
+        if not candidates:
+            return None
+
+        best = max(
+            candidates,
+            key=lambda name: self._stats(name).utility(self.latency_weight, candidates[name].estimated_wait())
+        )
+        if len(candidates) > 1 and random.random() < self.exploration:
+            choice = random.choice([name for name in candidates if name != best])
+            routed_requests.inc(provider=choice, reason="explore")
+            return choice
+        routed_requests.inc(provider=best, reason="best")
+        return best
+
+    def observe(self, stream_metrics: StreamMetrics):
+        """Fold a finished provider stream into its statistics; replays are skipped"""
+        if stream_metrics.source != "upstream":
+            return
+        if stream_metrics.outcome in ["success", "error"]:
+            self._stats(stream_metrics.provider).record(stream_metrics.ttft, stream_metrics.outcome == "error")
+
+    def record_rating(self, providers: Iterable[str], score: int, previous: Optional[int] = None):
+        """A rating of an answer counts for every provider that contributed to it"""
+        for provider in providers:
+            stats = self._stats(provider)
+            if previous is not None:
+                stats.rate(previous, -1)
+            stats.rate(score)
+
+    async def load(self):
+        """Rating totals and recent response times, read once at startup"""
+        async with ReadSessionLocal() as db:
+            ratings = await db.execute(
+                select(ProviderResponse.provider, Rating.score, func.count())
+                .join(Rating, Rating.message_id == ProviderResponse.message_id)
+                .group_by(ProviderResponse.provider, Rating.score)
+            )
+            for provider, score, count in ratings:
+                self._stats(provider).rate(score, count)
+
+            providers = (await db.execute(select(ProviderResponse.provider).distinct())).scalars().all()
+            for provider in providers:
+                recent = (await db.execute(
+                    select(ProviderResponse.ttft, ProviderResponse.content.startswith(ERROR_PREFIX))
+                    .where(ProviderResponse.provider == provider)
+                    .order_by(ProviderResponse.created_at.desc())
+                    .limit(WARM_START_RESPONSES)
+                )).all()
+                stats = self._stats(provider)
+                for ttft, failed in reversed(recent):
+                    stats.record(ttft / 1000 if ttft is not None else None, bool(failed))
+        self.loaded = True
+
+    def snapshot(self) -> dict:
+        return {name: stats.to_dict() for name, stats in self.stats.items()}
+
+provider_router = ProviderRouter(settings.ROUTER_LATENCY_WEIGHT, settings.ROUTER_EXPLORATION, settings.ROUTER_EWMA_ALPHA)
@@ -0,0 +1,105 @@
+import asyncio
+from typing import AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from config import settings
+from backend.providers.base import ProviderClient
+from backend.utils.metrics import metrics
+from backend.utils.text import normalize_text
+
+single_flight_requests = metrics.counter(
+    "single_flight_requests_total", "Provider streams by single-flight role", ["provider", "role"]
+)
+
+class _Flight:
+    """One upstream stream, buffered so late joiners can catch up"""
+
+    def __init__(self):
+        self.tokens: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def run(self, source: AsyncIterator[str]):
+        try:
+            async for token in source:
+                self.tokens.append(token)
+                self._notify()
+        except Exception as e:
+            # Every subscriber sees the upstream failure
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    async def subscribe(self) -> AsyncGenerator[str, None]:
+        position = 0
+        while True:
+            while position < len(self.tokens):
+                yield self.tokens[position]
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+class SingleFlight:
+    """Coalesces identical concurrent requests onto one upstream stream"""
+
+    def __init__(self):
+        self._flights: Dict[Tuple[str, str, str], _Flight] = {}
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def _finish(self, key: Tuple[str, str, str], flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def stream(
+        self, provider: ProviderClient, prompt: str, factory: Callable[[], AsyncIterator[str]],
+        mark: Optional[Callable[[str], None]] = None
+    ) -> AsyncGenerator[str, None]:
+        """Attach to the in-flight stream for (provider, model, prompt) or start one
+
+        mark, if given, is called with "joined" when the request rides on
+        another request's stream.
+        """
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            async for token in factory():
+                yield token
+            return
+
+        name = provider.get_name()
+        key = (name, provider.model, normalize_text(prompt))
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.create_task(flight.run(factory()))
+            flight.task.add_done_callback(lambda _: self._finish(key, flight))
+            single_flight_requests.inc(provider=name, role="leader")
+        else:
+            single_flight_requests.inc(provider=name, role="joined")
+            if mark is not None:
+                mark("joined")
+
+        flight.subscribers += 1
+        try:
+            async for token in flight.subscribe():
+                yield token
+        finally:
+            flight.subscribers -= 1
+            if flight.done:
+                # Later requests must start a fresh flight (or hit the cache)
+                self._finish(key, flight)
+            elif flight.subscribers == 0:
+                # Nobody is listening any more; stop the upstream stream
+                self._finish(key, flight)
+                flight.task.cancel()
+
+single_flight = SingleFlight()
@@ -4,6 +4,8 @@ from typing import AsyncGenerator
 from backend.providers.base import ProviderClient
 
 class StubProvider(ProviderClient):
+    model = "stub"
+    
     def __init__(self, name: str):
         self.name = name
         self.sample_responses = [
@@ -0,0 +1,64 @@
+from fastapi import APIRouter
+from typing import Optional
+
+from backend.providers.http_pool import http_pool
+from backend.cache.response_cache import response_cache
+from backend.db import storage_profile
+from backend.persistence import persistence
+from backend.providers.registry import provider_registry
+from backend.providers.routing import provider_router
+from backend.routers.chat import active_providers
+from backend.streaming.websocket import websocket_manager
+
+router = APIRouter()
+
+@router.get("/admin/pool")
+async def get_pool_stats():
+    """Connection pool statistics for every provider HTTP client"""
+    return {"providers": http_pool.stats()}
+
+@router.get("/admin/providers")
+async def get_provider_health():
+    """Circuit breaker state and adaptive timeouts per provider"""
+    return {
+        "providers": {
+            name: provider.health() if hasattr(provider, "health") else {"state": "closed"}
+            for name, provider in active_providers.items()
+        }
+    }
+
+@router.get("/admin/routing")
+async def get_routing_stats():
+    """Per-provider statistics the single-mode router chooses from"""
+    return {"providers": provider_router.snapshot(), "loaded": provider_router.loaded}
+
+@router.get("/admin/persistence")
+async def get_persistence_stats():
+    """Rows waiting for the write-behind writer, and how many were written or lost"""
+    return persistence.stats()
+
+@router.get("/admin/storage")
+async def get_storage_profile():
+    """Effective SQLite pragmas and pool sizes per engine, as checked at startup"""
+    return storage_profile
+
+@router.get("/admin/startup")
+async def get_provider_startup():
+    """Import and construction time per provider, and whether it fell back to a stub"""
+    return {"providers": provider_registry.load_stats, "loaded": provider_registry.loaded()}
+
+@router.get("/admin/websockets")
+async def get_websocket_queues():
+    """Queued outbound frames per WebSocket connection, by chat, and replay buffer usage"""
+    return {"queue_depths": websocket_manager.queue_depths(), "replay": websocket_manager.replay.stats()}
+
+@router.get("/admin/cache")
+async def get_cache_stats():
+    """Response cache hit rate and occupancy"""
+    return response_cache.stats()
+
+@router.delete("/admin/cache")
+async def invalidate_cache(provider: Optional[str] = None):
+    """Invalidate cached responses, optionally for a single provider"""
+    removed = await response_cache.invalidate(provider)
+    return {"status": "success", "removed": removed}
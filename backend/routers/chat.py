@@ -1,51 +1,87 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import and_, or_, select
+import base64
+import json
 import uuid
 from datetime import datetime
 import asyncio
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
 
-from backend.db import get_db
+from backend.db import get_db, get_read_db
+from backend.persistence import persistence
 from backend.models import Chat, Message, ProviderResponse
 from backend.schemas import (
     ChatCreate, ChatResponse, MessageSend, MessageResponse, 
-    ChatHistoryResponse, ProviderResponseSchema
+    ChatHistoryResponse, ProviderResponseSchema, AggregatePolicy
 )
+from config import settings
 from backend.providers.base import ProviderClient
-from backend.providers.stubs import StubProvider
-from backend.providers.openai import OpenAIProvider
-from backend.providers.groq import GroqProvider
-from backend.providers.deepseek import DeepSeekProvider
-from backend.providers.gemini import GeminiProvider
+from backend.providers.admission import request_priority
+from backend.providers.singleflight import single_flight
+from backend.providers.registry import provider_registry
+from backend.providers.routing import provider_router
 from backend.aggregator.synth import Synthesizer
+from backend.aggregator.rank import IncrementalRanker
 from backend.streaming.websocket import websocket_manager
+from backend.streaming.sse import SSE_HEADERS, event_generator
+from backend.utils.sse import encode_event
+from backend.utils.metrics import StreamMetrics
+from backend.cache.response_cache import response_cache
+from backend.cache.similarity import similarity_index
 
 router = APIRouter()
 
-# Initialize providers
-providers = {
-    "openai": OpenAIProvider(),
-    "groq": GroqProvider(), 
-    "deepseek": DeepSeekProvider(),
-    "gemini": GeminiProvider()
-}
-
-# Fallback to stubs if no API keys
-active_providers = {}
-for name, provider in providers.items():
-    if provider.is_configured():
-        active_providers[name] = provider
-    else:
-        active_providers[name] = StubProvider(name)
+# Providers are imported and built on first use; see backend/providers/registry.py
+active_providers = provider_registry
+
+# Generations started by streaming sends; held so they finish even if the client leaves
+streaming_generations: Set[asyncio.Task] = set()
+
+async def select_providers(chat_id: str, max_wait: Optional[float] = None) -> Dict[str, ProviderClient]:
+    """Providers to fan out to, skipping open circuits and queues longer than max_wait"""
+    selected = {}
+    for name, provider in active_providers.items():
+        if not provider.is_available():
+            reason = "temporarily unavailable"
+        elif max_wait is not None and provider.estimated_wait() > max_wait:
+            reason = "too busy to answer in time"
+        else:
+            selected[name] = provider
+            continue
+        await websocket_manager.send_provider_token(chat_id, name, f"Skipped {name}: {reason}", True)
+    return selected
 
 synthesizer = Synthesizer()
 
+def provider_stream(
+    provider: ProviderClient, prompt: str, stream_metrics: Optional[StreamMetrics] = None
+) -> AsyncIterator[str]:
+    """Provider tokens, shared with identical in-flight requests and served from cache
+
+    stream_metrics is marked when the tokens are a replay, so only streams
+    that reached the provider feed its metrics and the router.
+    """
+    mark = stream_metrics.mark if stream_metrics is not None else None
+    return single_flight.stream(provider, prompt, lambda: response_cache.stream(provider, prompt, mark), mark)
+
+def build_aggregate_policy(message_data: Optional[MessageSend] = None) -> AggregatePolicy:
+    """Resolve the aggregate policy from request overrides and Settings"""
+    overrides = message_data.model_dump(exclude_none=True) if message_data else {}
+    return AggregatePolicy(
+        deadline=overrides.get("deadline", settings.AGGREGATE_DEADLINE),
+        quorum=overrides.get("quorum", settings.AGGREGATE_QUORUM),
+        early_synthesis=overrides.get("early_synthesis", settings.AGGREGATE_EARLY_SYNTHESIS),
+        stragglers=overrides.get("stragglers", settings.AGGREGATE_STRAGGLERS)
+    )
+
 @router.post("/chat/new", response_model=ChatResponse)
 async def create_chat(chat_data: ChatCreate, db: AsyncSession = Depends(get_db)):
     chat = Chat(title=chat_data.title)
     db.add(chat)
+    # Defaults are filled in client-side; a refresh would only hold the write connection
     await db.commit()
-    await db.refresh(chat)
     return ChatResponse(
         id=chat.id,
         title=chat.title,
@@ -59,12 +95,13 @@ async def send_message(
     background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db)
 ):
+    policy = build_aggregate_policy(message_data)
+
     # Create new chat if no chat_id provided
     if not message_data.chat_id:
         chat = Chat()
         db.add(chat)
         await db.commit()
-        await db.refresh(chat)
         chat_id = chat.id
     else:
         chat_id = message_data.chat_id
@@ -80,8 +117,24 @@ async def send_message(
         is_user=True
     )
     db.add(user_message)
+    # Committed without a refresh, so the write connection is free while the answer streams
     await db.commit()
-    await db.refresh(user_message)
+
+    if message_data.stream:
+        # Single-request mode: answer with the event stream itself
+        last_seq = websocket_manager.last_seq(chat_id)
+        generation = asyncio.create_task(process_ai_responses(
+            chat_id, user_message.id, message_data.message, message_data.mode or "aggregate", policy
+        ))
+        streaming_generations.add(generation)
+        generation.add_done_callback(streaming_generations.discard)
+        start = encode_event(json.dumps({
+            "type": "start", "chat_id": chat_id, "user_message_id": user_message.id, "last_seq": last_seq
+        }))
+        return StreamingResponse(
+            event_generator(chat_id, last_seq, until=generation, first=start),
+            media_type="text/event-stream", headers=SSE_HEADERS
+        )
 
     # Start background task to process AI responses
     background_tasks.add_task(
@@ -89,129 +142,277 @@ async def send_message(
         chat_id, 
         user_message.id, 
         message_data.message,
-        message_data.mode or "aggregate"  # Default to aggregate mode
+        message_data.mode or "aggregate",  # Default to aggregate mode
+        policy
     )
 
-    return {"chat_id": chat_id, "user_message_id": user_message.id}
+    # Connect with ?last_seq=<this> to receive this answer's stream from its start
+    return {"chat_id": chat_id, "user_message_id": user_message.id, "last_seq": websocket_manager.last_seq(chat_id)}
 
-async def process_ai_responses(chat_id: str, user_message_id: str, user_message: str, mode: str):
+async def process_ai_responses(
+    chat_id: str, user_message_id: str, user_message: str, mode: str,
+    policy: Optional[AggregatePolicy] = None
+):
     """Process AI responses based on selected mode"""
+    # Interactive single-provider answers are admitted ahead of fan-out
+    request_priority.set(0 if mode == "single" else 1)
     if mode == "single":
-        # Use only one provider (default to openai)
-        selected_provider = list(active_providers.keys())[0]
-        await process_single_provider(chat_id, user_message_id, user_message, selected_provider)
+        selected_provider = provider_router.choose(active_providers)
+        if selected_provider is None:
+            await websocket_manager.send_provider_token(chat_id, "system", "No provider is available", True)
+            return
+        await process_single_provider(chat_id, user_message_id, user_message, selected_provider, "single")
     elif mode == "multiple":
         await process_multiple_providers(chat_id, user_message_id, user_message)
     else:  # aggregate mode
-        await process_aggregated_response(chat_id, user_message_id, user_message)
+        await process_aggregated_response(chat_id, user_message_id, user_message, policy)
 
-async def process_single_provider(chat_id: str, user_message_id: str, user_message: str, provider_name: str):
+async def process_single_provider(
+    chat_id: str, user_message_id: str, user_message: str, provider_name: str,
+    mode: str = "single"
+):
     """Process response from a single provider"""
     provider = active_providers.get(provider_name)
     if not provider:
         return
 
     full_response = ""
+    stream_metrics = StreamMetrics(provider_name, mode)
     try:
-        async for token in provider.generate(user_message):
+        async for token in stream_metrics.track(provider_stream(provider, user_message, stream_metrics)):
             await websocket_manager.send_provider_token(chat_id, provider_name, token)
             full_response += token
         
         await websocket_manager.send_provider_token(chat_id, provider_name, "", True)
         
-        # Save the response
-        async for db in get_db():
-            response_message = Message(
-                chat_id=chat_id,
-                content=full_response,
-                is_user=False
-            )
-            db.add(response_message)
-            await db.commit()
-            await db.refresh(response_message)
-
-            # Save provider response
-            provider_response = ProviderResponse(
-                message_id=response_message.id,
-                provider=provider_name,
-                content=full_response
-            )
-            db.add(provider_response)
-            await db.commit()
+        # Save the response; written behind, off the streaming path
+        response_message = await persistence.add(
+            Message, keys=(chat_id,), chat_id=chat_id, content=full_response, is_user=False
+        )
+        await persistence.add(
+            ProviderResponse,
+            keys=(chat_id, response_message["id"]),
+            message_id=response_message["id"],
+            provider=provider_name,
+            content=full_response,
+            **stream_metrics.as_columns()
+        )
 
     except Exception as e:
         error_msg = f"Error from {provider_name}: {str(e)}"
         await websocket_manager.send_provider_token(chat_id, provider_name, error_msg, True)
+    finally:
+        provider_router.observe(stream_metrics)
 
 async def process_multiple_providers(chat_id: str, user_message_id: str, user_message: str):
     """Process responses from all providers separately"""
     tasks = []
-    for provider_name, provider in active_providers.items():
-        task = process_single_provider(chat_id, user_message_id, user_message, provider_name)
+    for provider_name, provider in (await select_providers(chat_id)).items():
+        task = process_single_provider(chat_id, user_message_id, user_message, provider_name, "multiple")
         tasks.append(task)
     
     await asyncio.gather(*tasks, return_exceptions=True)
 
-async def process_aggregated_response(chat_id: str, user_message_id: str, user_message: str):
+async def process_aggregated_response(
+    chat_id: str, user_message_id: str, user_message: str,
+    policy: Optional[AggregatePolicy] = None
+):
     """Process responses from all providers and synthesize them"""
+    if policy is None:
+        policy = build_aggregate_policy()
+    if settings.SIMILAR_PROMPT_CACHE_ENABLED and await replay_similar_response(chat_id, user_message):
+        return
+
     responses = {}
-    tasks = []
+    stream_stats = {}
+    succeeded = set()
+    # Ranking features are updated per token, so ranking at the end is cheap
+    ranker = IncrementalRanker()
 
     async def collect_provider_response(provider_name: str, provider: ProviderClient):
         full_response = ""
+        stream_metrics = stream_stats[provider_name] = StreamMetrics(provider_name, "aggregate")
+        features = ranker.stream(provider_name)
         try:
-            async for token in provider.generate(user_message):
+            async for token in stream_metrics.track(provider_stream(provider, user_message, stream_metrics)):
                 await websocket_manager.send_provider_token(chat_id, provider_name, token)
                 full_response += token
+                features.feed(token)
             await websocket_manager.send_provider_token(chat_id, provider_name, "", True)
             responses[provider_name] = full_response
+            succeeded.add(provider_name)
+        except asyncio.CancelledError:
+            # Cut off as a straggler; close the client's stream for this provider
+            await websocket_manager.send_provider_token(chat_id, provider_name, "", True)
+            raise
         except Exception as e:
             error_msg = f"Error from {provider_name}: {str(e)}"
             await websocket_manager.send_provider_token(chat_id, provider_name, error_msg, True)
             responses[provider_name] = error_msg
+            ranker.set(provider_name, error_msg)
+        finally:
+            provider_router.observe(stream_metrics)
 
     # Start all providers
-    for provider_name, provider in active_providers.items():
-        task = collect_provider_response(provider_name, provider)
-        tasks.append(task)
+    pending = {
+        asyncio.create_task(collect_provider_response(provider_name, provider))
+        for provider_name, provider in (await select_providers(chat_id, policy.deadline)).items()
+    }
+    quorum = min(policy.quorum or len(pending), len(pending))
 
-    # Wait for all providers to complete
-    await asyncio.gather(*tasks, return_exceptions=True)
+    # Wait until every provider finished, the deadline passed or, with early
+    # synthesis, enough providers succeeded
+    loop = asyncio.get_running_loop()
+    deadline_at = loop.time() + policy.deadline
+    while pending:
+        timeout = deadline_at - loop.time()
+        if timeout <= 0:
+            break
+        _, pending = await asyncio.wait(
+            pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+        )
+        if policy.early_synthesis and len(succeeded) >= quorum:
+            break
 
-    # Synthesize responses
-    synthesized_response = synthesizer.synthesize(responses)
+    if pending and policy.stragglers == "cancel":
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        pending = set()
+
+    # Synthesize the responses that arrived in time
+    synthesized_responses = dict(responses)
+    synthesized_response = ""
     
-    # Stream synthesized response
-    for i in range(0, len(synthesized_response), 10):
-        token = synthesized_response[i:i+10]
-        await websocket_manager.send_synth_token(chat_id, token, False)
-        await asyncio.sleep(0.05)  # Simulate streaming
+    # Stream each part of the synthesis as soon as it is ready
+    ranked = ranker.rank(synthesized_responses)
+    for part in synthesizer.synthesize_stream(synthesized_responses, ranked):
+        async for token in paced(part):
+            await websocket_manager.send_synth_token(chat_id, token, False)
+        synthesized_response += part
     
     await websocket_manager.send_synth_token(chat_id, "", True)
 
     # Save synthesized response
-    async for db in get_db():
-        response_message = Message(
-            chat_id=chat_id,
-            content=synthesized_response,
-            is_user=False
+    response_message = await persistence.add(
+        Message, keys=(chat_id,), chat_id=chat_id, content=synthesized_response, is_user=False
+    )
+    for provider_name, content in synthesized_responses.items():
+        await persistence.add(
+            ProviderResponse,
+            keys=(chat_id, response_message["id"]),
+            message_id=response_message["id"],
+            provider=provider_name,
+            content=content,
+            **stream_stats[provider_name].as_columns()
         )
-        db.add(response_message)
-        await db.commit()
-        await db.refresh(response_message)
 
-        # Save all provider responses
+    if settings.SIMILAR_PROMPT_CACHE_ENABLED and succeeded:
+        await similarity_index.add(user_message_id, response_message["id"], user_message)
+
+    # Stragglers keep streaming to the client; save their output once done
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
         for provider_name, content in responses.items():
-            provider_response = ProviderResponse(
-                message_id=response_message.id,
-                provider=provider_name,
-                content=content
-            )
-            db.add(provider_response)
-        await db.commit()
+            if provider_name not in synthesized_responses:
+                await persistence.add(
+                    ProviderResponse,
+                    keys=(chat_id, response_message["id"]),
+                    message_id=response_message["id"],
+                    provider=provider_name,
+                    content=content,
+                    **stream_stats[provider_name].as_columns()
+                )
+
+async def paced(text: str) -> AsyncIterator[str]:
+    """Split text to a steady SYNTH_PACING_CHARS_PER_SEC rate; passes it through when 0"""
+    rate = settings.SYNTH_PACING_CHARS_PER_SEC
+    if rate <= 0:
+        yield text
+        return
+    # About 20 pieces a second, whatever the rate
+    size = max(1, int(rate / 20))
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+        await asyncio.sleep(size / rate)
+
+async def replay_similar_response(chat_id: str, user_message: str) -> bool:
+    """Serve a near-duplicate prompt from its stored provider responses and synthesis"""
+    match = similarity_index.lookup(user_message)
+    if not match:
+        return False
+    response_message_id, _ = match
+
+    async for db in get_read_db():
+        stored_message = await db.get(Message, response_message_id)
+        if not stored_message:
+            return False
+        result = await db.execute(
+            select(ProviderResponse).where(ProviderResponse.message_id == response_message_id)
+        )
+        stored_responses = result.scalars().all()
+
+        for stored in stored_responses:
+            await websocket_manager.send_provider_token(chat_id, stored.provider, stored.content)
+            await websocket_manager.send_provider_token(chat_id, stored.provider, "", True)
+        await websocket_manager.send_synth_token(chat_id, stored_message.content, False)
+        await websocket_manager.send_synth_token(chat_id, "", True)
+
+    response_message = await persistence.add(
+        Message, keys=(chat_id,), chat_id=chat_id, content=stored_message.content, is_user=False
+    )
+    for stored in stored_responses:
+        await persistence.add(
+            ProviderResponse,
+            keys=(chat_id, response_message["id"]),
+            message_id=response_message["id"],
+            provider=stored.provider,
+            content=stored.content
+        )
+    return True
+
+def encode_cursor(message: Message) -> str:
+    """Opaque keyset position of a message: its (created_at, id)"""
+    raw = f"{message.created_at.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, message_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), message_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_after(position: Tuple[datetime, str], inclusive: bool = False):
+    created_at, message_id = position
+    same_time = Message.id >= message_id if inclusive else Message.id > message_id
+    return or_(Message.created_at > created_at, and_(Message.created_at == created_at, same_time))
+
+def keyset_before(position: Tuple[datetime, str], inclusive: bool = False):
+    created_at, message_id = position
+    same_time = Message.id <= message_id if inclusive else Message.id < message_id
+    return or_(Message.created_at < created_at, and_(Message.created_at == created_at, same_time))
 
 @router.get("/chat/{chat_id}/history", response_model=ChatHistoryResponse)
-async def get_chat_history(chat_id: str, db: AsyncSession = Depends(get_db)):
+async def get_chat_history(
+    chat_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    provider_bodies: bool = True,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Messages in (created_at, id) order, with their provider responses
+
+    Without a limit the whole conversation is returned. With one, the page
+    holds the newest messages (before `before`, if given), or the oldest
+    after `after`; pass the returned cursors to continue. Always three
+    queries, however long the chat.
+    """
+    # Include this chat's answers still queued for writing
+    await persistence.flush(chat_id)
+
     # Get chat
     result = await db.execute(select(Chat).where(Chat.id == chat_id))
     chat = result.scalar_one_or_none()
@@ -219,20 +420,46 @@ async def get_chat_history(chat_id: str, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Chat not found")
 
     # Get messages
-    result = await db.execute(
-        select(Message).where(Message.chat_id == chat_id).order_by(Message.created_at)
-    )
-    messages = result.scalars().all()
+    query = select(Message).where(Message.chat_id == chat_id)
+    if before:
+        query = query.where(keyset_before(decode_cursor(before)))
+    if after:
+        query = query.where(keyset_after(decode_cursor(after)))
+    # Paging backwards reads newest first, then restores chronological order
+    backwards = after is None
+    if backwards:
+        query = query.order_by(Message.created_at.desc(), Message.id.desc())
+    else:
+        query = query.order_by(Message.created_at, Message.id)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    messages = list((await db.execute(query)).scalars().all())
+    has_more = limit is not None and len(messages) > limit
+    messages = messages[:limit]
+    if backwards:
+        messages.reverse()
 
-    # Get provider responses
+    # Get provider responses of every assistant message in the page at once
     provider_responses = []
-    for message in messages:
-        if not message.is_user:
-            result = await db.execute(
-                select(ProviderResponse).where(ProviderResponse.message_id == message.id)
+    if any(not message.is_user for message in messages):
+        columns = [
+            ProviderResponse.message_id, ProviderResponse.provider, ProviderResponse.response_time,
+            ProviderResponse.ttft, ProviderResponse.token_count, ProviderResponse.tokens_per_sec
+        ]
+        if provider_bodies:
+            columns.append(ProviderResponse.content)
+        first, last = messages[0], messages[-1]
+        result = await db.execute(
+            select(*columns)
+            .join(Message, Message.id == ProviderResponse.message_id)
+            .where(
+                Message.chat_id == chat_id,
+                keyset_after((first.created_at, first.id), inclusive=True),
+                keyset_before((last.created_at, last.id), inclusive=True)
             )
-            message_responses = result.scalars().all()
-            provider_responses.extend(message_responses)
+            .order_by(Message.created_at, Message.id, ProviderResponse.created_at)
+        )
+        provider_responses = result.mappings().all()
 
     return ChatHistoryResponse(
         chat=ChatResponse(
@@ -252,9 +479,16 @@ async def get_chat_history(chat_id: str, db: AsyncSession = Depends(get_db)):
         ],
         provider_responses=[
             ProviderResponseSchema(
-                provider=resp.provider,
-                content=resp.content,
-                response_time=resp.response_time
+                message_id=resp["message_id"],
+                provider=resp["provider"],
+                content=resp.get("content"),
+                response_time=resp["response_time"],
+                ttft=resp["ttft"],
+                token_count=resp["token_count"],
+                tokens_per_sec=resp["tokens_per_sec"]
             ) for resp in provider_responses
-        ]
+        ],
+        has_more=has_more,
+        before_cursor=encode_cursor(messages[0]) if messages else before,
+        after_cursor=encode_cursor(messages[-1]) if messages else after
     )
\ No newline at end of file
@@ -2,16 +2,25 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
-from backend.db import get_db
-from backend.models import Rating, Message
+from backend.db import get_db, get_read_db
+from backend.models import Rating, Message, ProviderResponse
+from backend.persistence import persistence
+from backend.providers.routing import provider_router
 from backend.schemas import RatingCreate
 
 router = APIRouter()
 
 @router.post("/rating")
-async def create_rating(rating_data: RatingCreate, db: AsyncSession = Depends(get_db)):
+async def create_rating(
+    rating_data: RatingCreate,
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db)
+):
+    # The rated answer may still be queued for writing
+    await persistence.flush(rating_data.message_id)
+
     # Verify message exists and belongs to chat
-    result = await db.execute(
+    result = await read_db.execute(
         select(Message).where(
             Message.id == rating_data.message_id,
             Message.chat_id == rating_data.chat_id
@@ -29,6 +38,7 @@ async def create_rating(rating_data: RatingCreate, db: AsyncSession = Depends(ge
         select(Rating).where(Rating.message_id == rating_data.message_id)
     )
     existing_rating = result.scalar_one_or_none()
+    previous_score = existing_rating.score if existing_rating else None
     
     if existing_rating:
         existing_rating.score = rating_data.score
@@ -40,4 +50,10 @@ async def create_rating(rating_data: RatingCreate, db: AsyncSession = Depends(ge
         db.add(rating)
     
     await db.commit()
+
+    # Keep the single-mode router's like ratios current without rescanning ratings
+    providers = await read_db.execute(
+        select(ProviderResponse.provider).where(ProviderResponse.message_id == rating_data.message_id)
+    )
+    provider_router.record_rating(providers.scalars().all(), rating_data.score, previous_score)
     return {"status": "success"}
\ No newline at end of file
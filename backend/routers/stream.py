@@ -1,14 +1,30 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Header, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from typing import Optional
 from backend.streaming.websocket import websocket_manager
+from backend.streaming.sse import SSE_HEADERS, event_generator
 
 router = APIRouter()
 
 @router.websocket("/ws/chat/{chat_id}")
-async def websocket_endpoint(websocket: WebSocket, chat_id: str):
-    await websocket_manager.connect(websocket, chat_id)
+async def websocket_endpoint(
+    websocket: WebSocket, chat_id: str, last_seq: Optional[int] = None, encoding: str = "json"
+):
+    # Reconnecting clients pass the last seq they saw to get only what they missed;
+    # encoding=binary opts in to compact frames (see backend/streaming/framing.py)
+    await websocket_manager.connect(websocket, chat_id, last_seq, encoding)
     try:
         while True:
             data = await websocket.receive_text()
             # Handle incoming messages if needed
     except WebSocketDisconnect:
-        websocket_manager.disconnect(websocket, chat_id)
\ No newline at end of file
+        websocket_manager.disconnect(websocket, chat_id)
+
+@router.get("/sse/chat/{chat_id}")
+async def sse_endpoint(chat_id: str, last_seq: Optional[int] = None, last_event_id: Optional[str] = Header(None)):
+    """Server-Sent Events alternative to the WebSocket; resumes from Last-Event-ID or last_seq"""
+    if last_event_id and last_event_id.isdigit():
+        last_seq = int(last_event_id)
+    return StreamingResponse(
+        event_generator(chat_id, last_seq), media_type="text/event-stream", headers=SSE_HEADERS
+    )
@@ -1,7 +1,10 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 from datetime import datetime
 
+# What happens to providers still streaming once the synthesis is out
+StragglerPolicy = Literal["persist", "cancel"]
+
 class ChatCreate(BaseModel):
     title: Optional[str] = "New Chat"
 
@@ -15,6 +18,18 @@ class MessageSend(BaseModel):
     chat_id: Optional[str] = None
     message: str
     mode: Optional[str] = "aggregate"  # single, multiple, aggregate
+    # Aggregate mode policy overrides (defaults come from Settings)
+    deadline: Optional[float] = Field(None, gt=0)  # seconds to wait for providers
+    quorum: Optional[int] = Field(None, ge=1)  # minimum successful providers
+    early_synthesis: Optional[bool] = None  # synthesize as soon as quorum is met
+    stragglers: Optional[StragglerPolicy] = None
+    stream: Optional[bool] = False  # answer with an SSE stream instead of a background job
+
+class AggregatePolicy(BaseModel):
+    deadline: float
+    quorum: int
+    early_synthesis: bool
+    stragglers: StragglerPolicy
 
 class MessageResponse(BaseModel):
     id: str
@@ -24,9 +39,13 @@ class MessageResponse(BaseModel):
     created_at: datetime
 
 class ProviderResponseSchema(BaseModel):
+    message_id: Optional[str] = None
     provider: str
-    content: str
+    content: Optional[str]  # None when history is requested without provider bodies
     response_time: Optional[int]
+    ttft: Optional[int] = None
+    token_count: Optional[int] = None
+    tokens_per_sec: Optional[float] = None
 
 class RatingCreate(BaseModel):
     chat_id: str
@@ -37,6 +56,10 @@ class ChatHistoryResponse(BaseModel):
     chat: ChatResponse
     messages: List[MessageResponse]
     provider_responses: List[ProviderResponseSchema]
+    # Keyset cursors: pass as ?before= for older messages, ?after= for newer ones
+    has_more: bool = False
+    before_cursor: Optional[str] = None
+    after_cursor: Optional[str] = None
 
 class StreamEvent(BaseModel):
     type: str  # "provider" or "synth"
@@ -0,0 +1,58 @@
+import json
+import struct
+from typing import Dict, List, Optional
+from config import settings
+
+# kind, flags, provider index, seq; followed by the UTF-8 token (or JSON for KIND_JSON)
+HEADER = struct.Struct(">BBBI")
+
+KIND_PROVIDER = 0
+KIND_SYNTH = 1
+KIND_JSON = 2  # anything else, e.g. hello and reset, as a JSON payload
+
+FLAG_DONE = 1
+NO_PROVIDER = 255
+
+def provider_table() -> List[str]:
+    """Provider names by binary index, in PROVIDERS order"""
+    names = [entry.strip().partition("=")[0] for entry in settings.PROVIDERS.split(",")]
+    return [name for name in names if name][:NO_PROVIDER]
+
+class BinaryCodec:
+    """Compact binary frames for token events
+
+    A token frame is a 7-byte header plus the raw token, instead of a JSON
+    object repeating every key. Providers missing from the table, and other
+    event types, fall back to a JSON payload.
+    """
+
+    def __init__(self, providers: Optional[List[str]] = None):
+        self.providers = providers if providers is not None else provider_table()
+        self._index: Dict[str, int] = {name: i for i, name in enumerate(self.providers)}
+
+    def hello(self) -> dict:
+        """First frame on a binary connection, so clients can map provider indexes"""
+        return {"type": "hello", "encoding": "binary", "providers": self.providers}
+
+    def encode(self, message: dict) -> bytes:
+        kind = message.get("type")
+        flags = FLAG_DONE if message.get("done") else 0
+        seq = message.get("seq", 0)
+        if kind == "synth":
+            return HEADER.pack(KIND_SYNTH, flags, NO_PROVIDER, seq) + message["token"].encode("utf-8")
+        if kind == "provider" and message["provider"] in self._index:
+            index = self._index[message["provider"]]
+            return HEADER.pack(KIND_PROVIDER, flags, index, seq) + message["token"].encode("utf-8")
+        return HEADER.pack(KIND_JSON, 0, NO_PROVIDER, seq) + json.dumps(message).encode("utf-8")
+
+    def decode(self, data: bytes) -> dict:
+        kind, flags, index, seq = HEADER.unpack_from(data)
+        payload = data[HEADER.size:].decode("utf-8")
+        if kind == KIND_JSON:
+            return json.loads(payload)
+        if kind == KIND_PROVIDER:
+            message = {"type": "provider", "provider": self.providers[index]}
+        else:
+            message = {"type": "synth"}
+        message.update(token=payload, done=bool(flags & FLAG_DONE), seq=seq)
+        return message
@@ -0,0 +1,197 @@
+import asyncio
+import random
+from abc import ABC, abstractmethod
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import urlparse
+from backend.utils.metrics import metrics
+
+# handler(origin, chat_id, text)
+Handler = Callable[[str, str, str], None]
+
+pubsub_messages = metrics.counter(
+    "stream_pubsub_messages_total", "Stream events published to or received from the pub/sub backend",
+    ["backend", "direction"]
+)
+pubsub_dropped = metrics.counter(
+    "stream_pubsub_dropped_total", "Stream events dropped because the pub/sub backend was unreachable", ["backend"]
+)
+
+class PubSub(ABC):
+    """Fans stream events out to every worker's ConnectionManager"""
+
+    name = ""
+
+    @abstractmethod
+    async def start(self, handler: Handler):
+        """Begin delivering events from other publishers to handler"""
+        pass
+
+    @abstractmethod
+    def publish(self, origin: str, chat_id: str, text: str):
+        """Send an event; must not wait on the network"""
+        pass
+
+    async def close(self):
+        pass
+
+class InProcessPubSub(PubSub):
+    """Delivers to managers in this process only; the single-worker default"""
+
+    name = "inprocess"
+
+    def __init__(self):
+        self._handlers: List[Handler] = []
+
+    async def start(self, handler: Handler):
+        self._handlers.append(handler)
+
+    def publish(self, origin: str, chat_id: str, text: str):
+        for handler in self._handlers:
+            handler(origin, chat_id, text)
+
+    async def close(self):
+        self._handlers.clear()
+
+def encode_command(*args: str) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg.encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+async def read_reply(reader: asyncio.StreamReader):
+    """Read one RESP2 reply; bulk strings come back as bytes"""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed")
+    kind, value = line[:1], line[1:-2]
+    if kind == b"+":
+        return value.decode()
+    if kind == b"-":
+        raise ConnectionError(value.decode())
+    if kind == b":":
+        return int(value)
+    if kind == b"$":
+        length = int(value)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        length = int(value)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise ConnectionError(f"Unexpected reply: {line!r}")
+
+class RedisPubSub(PubSub):
+    """Redis-protocol pub/sub over two plain connections, one per direction
+
+    Events go to the `<prefix><chat_id>` channel as "<origin>\\n<frame json>";
+    every worker pattern-subscribes to `<prefix>*`. Works with Redis, Valkey
+    or backend/streaming/resp_broker.py.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "chat-stream:", max_pending: int = 10000):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.prefix = prefix
+        self.max_pending = max_pending
+        self._pending: List[Tuple[str, str]] = []
+        self._ready = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self.subscribed = asyncio.Event()
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            writer.write(encode_command("AUTH", self.password))
+            await writer.drain()
+            await read_reply(reader)
+        return reader, writer
+
+    async def start(self, handler: Handler):
+        self._tasks = [
+            asyncio.create_task(self._subscriber(handler)),
+            asyncio.create_task(self._publisher())
+        ]
+        # Do not accept traffic before this worker can hear other workers
+        await asyncio.wait_for(self.subscribed.wait(), timeout=5)
+
+    def publish(self, origin: str, chat_id: str, text: str):
+        if len(self._pending) >= self.max_pending:
+            # The broker is down or too slow; local viewers still get the event
+            pubsub_dropped.inc(backend=self.name)
+            return
+        self._pending.append((self.prefix + chat_id, origin + "\n" + text))
+        self._ready.set()
+
+    async def _reconnecting(self, run):
+        delay = 0.1
+        while True:
+            try:
+                await run()
+                delay = 0.1
+            except asyncio.CancelledError:
+                raise
+            except (OSError, ConnectionError, asyncio.IncompleteReadError):
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+                delay = min(delay * 2, 5.0)
+
+    async def _subscriber(self, handler: Handler):
+        async def run():
+            reader, writer = await self._connect()
+            try:
+                writer.write(encode_command("PSUBSCRIBE", self.prefix + "*"))
+                await writer.drain()
+                await read_reply(reader)
+                self.subscribed.set()
+                while True:
+                    reply = await read_reply(reader)
+                    if isinstance(reply, list) and len(reply) == 4 and reply[0] == b"pmessage":
+                        chat_id = reply[2].decode("utf-8")[len(self.prefix):]
+                        origin, _, text = reply[3].decode("utf-8").partition("\n")
+                        pubsub_messages.inc(backend=self.name, direction="received")
+                        handler(origin, chat_id, text)
+            finally:
+                writer.close()
+
+        await self._reconnecting(run)
+
+    async def _publisher(self):
+        async def run():
+            reader, writer = await self._connect()
+            try:
+                while True:
+                    if not self._pending:
+                        self._ready.clear()
+                        await self._ready.wait()
+                    # Pipeline everything queued since the last write
+                    batch, self._pending = self._pending, []
+                    writer.write(b"".join(encode_command("PUBLISH", channel, payload) for channel, payload in batch))
+                    await writer.drain()
+                    for _ in batch:
+                        await read_reply(reader)
+                    pubsub_messages.inc(len(batch), backend=self.name, direction="published")
+            finally:
+                writer.close()
+
+        await self._reconnecting(run)
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+def create_pubsub(url: Optional[str]) -> PubSub:
+    """Backend for STREAM_PUBSUB_URL: empty for in-process, redis://host:port otherwise"""
+    if not url:
+        return InProcessPubSub()
+    if urlparse(url).scheme not in ["redis", "resp"]:
+        raise ValueError(f"Unsupported STREAM_PUBSUB_URL: {url}")
+    return RedisPubSub(url)
@@ -0,0 +1,128 @@
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+from config import settings
+from backend.utils.metrics import metrics
+
+replay_buffer_bytes = metrics.gauge("stream_replay_buffer_bytes", "Bytes held in stream replay buffers")
+replay_evictions = metrics.counter(
+    "stream_replay_evictions_total", "Replay buffers or events evicted", ["reason"]
+)
+
+class ReplayBuffer:
+    """Recent events of one chat, oldest first, as (seq, message, text)"""
+
+    def __init__(self, seq: int):
+        self.seq = seq
+        self.events: Deque[Tuple[int, dict, str]] = deque()
+        self.size = 0
+        self.updated = time.monotonic()
+
+    def first_seq(self) -> int:
+        return self.events[0][0] if self.events else self.seq + 1
+
+class ReplayStore:
+    """Per-chat sequence numbers and bounded buffers of recent stream events
+
+    Buffers are dropped once a chat has been quiet for WS_REPLAY_TTL seconds,
+    and the oldest events go first when the total exceeds WS_REPLAY_MAX_BYTES.
+    """
+
+    def __init__(self):
+        # Least recently updated chat first
+        self._buffers: "OrderedDict[str, ReplayBuffer]" = OrderedDict()
+        self.size = 0
+        # Events recorded across all chats; new buffers start from here so a
+        # chat's sequence numbers never go backwards after its buffer is evicted
+        self._recorded = 0
+
+    def _buffer(self, chat_id: str) -> ReplayBuffer:
+        buffer = self._buffers.get(chat_id)
+        if buffer is None:
+            buffer = self._buffers[chat_id] = ReplayBuffer(self._recorded)
+        else:
+            self._buffers.move_to_end(chat_id)
+        return buffer
+
+    def last_seq(self, chat_id: str) -> int:
+        """Current sequence number; starts a buffer so the next events are kept"""
+        buffer = self._buffer(chat_id)
+        buffer.updated = time.monotonic()
+        return buffer.seq
+
+    def record(self, chat_id: str, message: dict, serialize) -> Tuple[dict, str]:
+        """Stamp the next sequence number on a message and keep it for replay"""
+        buffer = self._buffer(chat_id)
+        self._recorded = max(self._recorded, buffer.seq) + 1
+        buffer.seq += 1
+        message = {**message, "seq": buffer.seq}
+        text = serialize(message)
+        self._append(buffer, message, text)
+        return message, text
+
+    def store(self, chat_id: str, message: dict, text: str):
+        """Keep an event sequenced by another worker"""
+        buffer = self._buffers.get(chat_id)
+        if buffer is None:
+            buffer = self._buffers[chat_id] = ReplayBuffer(message["seq"] - 1)
+        else:
+            self._buffers.move_to_end(chat_id)
+        buffer.seq = max(buffer.seq, message["seq"])
+        self._recorded = max(self._recorded, message["seq"])
+        self._append(buffer, message, text)
+
+    def _append(self, buffer: ReplayBuffer, message: dict, text: str):
+        buffer.events.append((message["seq"], message, text))
+        buffer.size += len(text)
+        buffer.updated = time.monotonic()
+        self._grow(len(text))
+
+        if len(buffer.events) > settings.WS_REPLAY_MAX_EVENTS:
+            self._drop_oldest(buffer, "events")
+        self._evict()
+
+    def since(self, chat_id: str, last_seq: int) -> Optional[List[Tuple[dict, str]]]:
+        """Events after last_seq, or None if some of them are no longer buffered"""
+        buffer = self._buffers.get(chat_id)
+        if buffer is None:
+            return None
+        if last_seq > buffer.seq or last_seq + 1 < buffer.first_seq():
+            return None
+        return [(message, text) for seq, message, text in buffer.events if seq > last_seq]
+
+    def _grow(self, amount: int):
+        self.size += amount
+        replay_buffer_bytes.inc(amount)
+
+    def _drop_oldest(self, buffer: ReplayBuffer, reason: str):
+        _, _, text = buffer.events.popleft()
+        buffer.size -= len(text)
+        self._grow(-len(text))
+        replay_evictions.inc(reason=reason)
+
+    def _evict(self):
+        # Buffers are in update order, so expired ones are all at the front
+        cutoff = time.monotonic() - settings.WS_REPLAY_TTL
+        while self._buffers:
+            buffer = next(iter(self._buffers.values()))
+            if buffer.updated >= cutoff:
+                break
+            self._buffers.popitem(last=False)
+            self._grow(-buffer.size)
+            replay_evictions.inc(reason="age")
+
+        if self.size <= settings.WS_REPLAY_MAX_BYTES:
+            return
+        # Over budget: trim the least recently active chats first
+        for buffer in self._buffers.values():
+            while buffer.events and self.size > settings.WS_REPLAY_MAX_BYTES:
+                self._drop_oldest(buffer, "memory")
+            if self.size <= settings.WS_REPLAY_MAX_BYTES:
+                break
+
+    def stats(self) -> dict:
+        return {
+            "chats": len(self._buffers),
+            "events": sum(len(buffer.events) for buffer in self._buffers.values()),
+            "bytes": self.size
+        }
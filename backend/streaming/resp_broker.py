@@ -0,0 +1,105 @@
+"""Minimal Redis-protocol pub/sub broker, a stand-in for Redis in tests and local multi-worker runs
+
+Supports PUBLISH, SUBSCRIBE, PSUBSCRIBE, PING and AUTH (accepted, not checked):
+
+    python -m backend.streaming.resp_broker --port 6380
+    STREAM_PUBSUB_URL=redis://127.0.0.1:6380 uvicorn backend.main:app --workers 4
+"""
+import argparse
+import asyncio
+import fnmatch
+from typing import Dict, Optional, Set
+
+def _bulk(value: bytes) -> bytes:
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+class RESPBroker:
+    def __init__(self):
+        self.channels: Dict[bytes, Set[asyncio.StreamWriter]] = {}
+        self.patterns: Dict[bytes, Set[asyncio.StreamWriter]] = {}
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self.server = await asyncio.start_server(self._serve, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _read_command(self, reader: asyncio.StreamReader):
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()  # Inline command, e.g. from telnet
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    def _publish(self, channel: bytes, payload: bytes) -> int:
+        receivers = 0
+        frame = b"*3\r\n" + _bulk(b"message") + _bulk(channel) + _bulk(payload)
+        for writer in self.channels.get(channel, ()):
+            writer.write(frame)
+            receivers += 1
+        for pattern, writers in self.patterns.items():
+            if fnmatch.fnmatchcase(channel.decode("utf-8", "replace"), pattern.decode("utf-8", "replace")):
+                frame = b"*4\r\n" + _bulk(b"pmessage") + _bulk(pattern) + _bulk(channel) + _bulk(payload)
+                for writer in writers:
+                    writer.write(frame)
+                    receivers += 1
+        return receivers
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscriptions = 0
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    break
+                if not args:
+                    continue
+                command = args[0].upper()
+                if command == b"PUBLISH" and len(args) == 3:
+                    writer.write(b":%d\r\n" % self._publish(args[1], args[2]))
+                elif command in [b"SUBSCRIBE", b"PSUBSCRIBE"]:
+                    registry = self.channels if command == b"SUBSCRIBE" else self.patterns
+                    for name in args[1:]:
+                        registry.setdefault(name, set()).add(writer)
+                        subscriptions += 1
+                        kind = command.lower()
+                        writer.write(b"*3\r\n" + _bulk(kind) + _bulk(name) + b":%d\r\n" % subscriptions)
+                elif command == b"PING":
+                    writer.write(b"+PONG\r\n")
+                elif command in [b"AUTH", b"SELECT"]:
+                    writer.write(b"+OK\r\n")
+                else:
+                    writer.write(b"-ERR unknown command '%s'\r\n" % command)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            for registry in [self.channels, self.patterns]:
+                for writers in registry.values():
+                    writers.discard(writer)
+            writer.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    args = parser.parse_args()
+
+    async def serve():
+        broker = RESPBroker()
+        await broker.start(args.host, args.port)
+        await broker.server.serve_forever()
+
+    asyncio.run(serve())
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,42 @@
-# SSE implementation (alternative to WebSocket)
-from fastapi import Request
-from fastapi.responses import StreamingResponse
-import json
+# SSE transport (alternative to WebSocket), fed by the same ConnectionManager fan-out
 import asyncio
+from typing import AsyncGenerator, Optional
+from config import settings
+from backend.streaming.websocket import websocket_manager
+from backend.utils.sse import encode_comment, encode_event
 
-async def event_generator(chat_id: str):
-    """SSE event generator - can be used as alternative to WebSocket"""
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"  # Keep nginx from buffering the stream
+}
+
+async def event_generator(
+    chat_id: str, last_seq: Optional[int] = None, until: Optional[asyncio.Task] = None,
+    first: Optional[str] = None
+) -> AsyncGenerator[str, None]:
+    """Provider and synth events for a chat as SSE, with heartbeats while idle
+
+    Each event's id is its seq, so a reconnecting EventSource resumes via
+    Last-Event-ID. With `until`, the stream ends once that task is done and
+    everything it sent has been delivered.
+    """
+    connection = websocket_manager.subscribe(chat_id, last_seq)
+    if until is not None:
+        until.add_done_callback(lambda _: connection.wake())
     try:
-        while True:
-            # This would integrate with the streaming system
-            # For now, just a placeholder implementation
-            await asyncio.sleep(1)
-            yield f"data: {json.dumps({'type': 'heartbeat'})}\n\n"
-    except asyncio.CancelledError:
-        print("SSE connection closed")
\ No newline at end of file
+        if first is not None:
+            yield first
+        while not connection.closed:
+            if until is not None and until.done():
+                websocket_manager.flush(chat_id)
+                if not connection.queue:
+                    return
+            frame = await connection.get(timeout=settings.SSE_HEARTBEAT_INTERVAL)
+            if frame is None:
+                if until is None or not until.done():
+                    yield encode_comment("heartbeat")
+                continue
+            message, text = frame
+            yield encode_event(text, message.get("seq"))
+    finally:
+        websocket_manager.disconnect(connection, chat_id)
@@ -1,53 +1,294 @@
 from fastapi import WebSocket
-from typing import Dict, List
+from typing import Deque, Dict, List, Optional, Tuple
+from collections import deque
 import json
 import asyncio
+import uuid
+from config import settings
+from backend.utils.metrics import metrics
+from backend.streaming.replay import ReplayStore
+from backend.streaming.pubsub import PubSub, InProcessPubSub, create_pubsub
+from backend.streaming.framing import BinaryCodec
+
+websocket_queued = metrics.gauge(
+    "websocket_send_queue_frames", "Frames waiting in per-connection send queues"
+)
+websocket_dropped = metrics.counter(
+    "websocket_frames_dropped_total", "Frames dropped or merged because a send queue was full", ["policy"]
+)
+websocket_slow_disconnects = metrics.counter(
+    "websocket_slow_consumer_disconnects_total", "Connections closed for falling too far behind"
+)
+
+class _Batch:
+    """Tokens waiting to go out as one frame"""
 
-class ConnectionManager:
     def __init__(self):
+        self.tokens: List[str] = []
+        self.size = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+class _Connection:
+    """One subscriber with its own bounded send queue
+
+    WebSockets are drained by a writer task; other subscribers (SSE) read
+    from the queue with `get`.
+    """
+
+    def __init__(self, websocket: Optional[WebSocket] = None, codec: Optional[BinaryCodec] = None):
+        self.websocket = websocket
+        # Binary framing when set, JSON text otherwise
+        self.codec = codec
+        # [message, JSON text, binary frame]; encodings are None until needed
+        # or after the message was merged
+        self.queue: Deque[list] = deque()
+        self.closed = False
+        self._ready = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+
+    def enqueue(self, message: dict, text: Optional[str], data: Optional[bytes] = None) -> bool:
+        """Queue a frame; False means the connection should be dropped"""
+        if len(self.queue) >= settings.WS_SEND_QUEUE_SIZE:
+            policy = settings.WS_OVERFLOW_POLICY
+            if policy == "disconnect":
+                websocket_slow_disconnects.inc()
+                return False
+            if policy == "coalesce" and self._coalesce(message):
+                websocket_dropped.inc(policy=policy)
+                return True
+            # Control frames (done, reset, hello) are never dropped; with
+            # only those queued, the queue goes over its bound instead
+            if self._evict_token_frame():
+                websocket_dropped.inc(policy=policy)
+        self.queue.append([message, text, data])
+        websocket_queued.inc()
+        self._ready.set()
+        return True
+
+    def _evict_token_frame(self) -> bool:
+        """Drop the oldest queued token frame that does not end its stream"""
+        for index, entry in enumerate(self.queue):
+            if entry[0]["type"] in ["provider", "synth"] and not entry[0]["done"]:
+                del self.queue[index]
+                websocket_queued.dec()
+                return True
+        return False
+
+    def _coalesce(self, message: dict) -> bool:
+        """Append the token to the newest queued frame of the same stream"""
+        for entry in reversed(self.queue):
+            queued = entry[0]
+            if queued["type"] == message["type"] and queued.get("provider") == message.get("provider"):
+                if queued["done"]:
+                    return False
+                entry[0] = {
+                    **queued, "token": queued["token"] + message["token"],
+                    "done": message["done"], "seq": message["seq"]
+                }
+                entry[1] = entry[2] = None
+                return True
+        return False
+
+    def wake(self):
+        self._ready.set()
+
+    def close(self, code: int = 1000):
+        self.closed = True
+        self.wake()
+        if self.websocket is not None:
+            asyncio.ensure_future(self.websocket.close(code=code))
+
+    async def _pop(self, timeout: Optional[float] = None) -> Optional[list]:
+        if not self.queue:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        if not self.queue:
+            return None
+        websocket_queued.dec()
+        return self.queue.popleft()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Tuple[dict, str]]:
+        """Next queued (message, text), or None on timeout or `wake`"""
+        entry = await self._pop(timeout)
+        if entry is None:
+            return None
+        message, text, _ = entry
+        return message, text if text is not None else json.dumps(message)
+
+    async def run(self):
+        try:
+            while True:
+                entry = await self._pop()
+                if entry is None:
+                    continue
+                message, text, data = entry
+                if self.codec is not None:
+                    await self.websocket.send_bytes(data if data is not None else self.codec.encode(message))
+                else:
+                    await self.websocket.send_text(text if text is not None else json.dumps(message))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            pass  # The socket is gone; the manager drops the connection
+        finally:
+            self.closed = True
+            websocket_queued.dec(len(self.queue))
+            self.queue.clear()
+
+class ConnectionManager:
+    def __init__(self, pubsub: Optional[PubSub] = None):
         self.active_connections: Dict[str, List[WebSocket]] = {}
-    
-    async def connect(self, websocket: WebSocket, chat_id: str):
+        # Keyed by the WebSocket, or by the _Connection itself for SSE subscribers
+        self._connections: Dict[object, _Connection] = {}
+        # (chat_id, type, provider) -> pending tokens
+        self._batches: Dict[Tuple[str, str, Optional[str]], _Batch] = {}
+        self.replay = ReplayStore()
+        self.codec = BinaryCodec()
+        # Events produced here are published so managers in other workers can
+        # deliver them to the clients they hold
+        self.pubsub = pubsub or InProcessPubSub()
+        self.node_id = uuid.uuid4().hex
+
+    async def start(self):
+        await self.pubsub.start(self._on_published)
+
+    async def close(self):
+        await self.pubsub.close()
+
+    def _on_published(self, origin: str, chat_id: str, text: str):
+        if origin == self.node_id:
+            return  # Already delivered locally
+        message = json.loads(text)
+        self.replay.store(chat_id, message, text)
+        self._deliver(chat_id, message, text)
+
+    async def connect(
+        self, websocket: WebSocket, chat_id: str, last_seq: Optional[int] = None, encoding: str = "json"
+    ):
+        """Register a socket; with last_seq, first replay the events it missed"""
         await websocket.accept()
+        connection = _Connection(websocket, self.codec if encoding == "binary" else None)
+        if connection.codec is not None:
+            hello = self.codec.hello()
+            connection.enqueue(hello, None, self.codec.encode(hello))
+        self._attach(chat_id, websocket, connection, last_seq)
+        connection.writer = asyncio.create_task(connection.run())
+        connection.writer.add_done_callback(lambda _: self.disconnect(websocket, chat_id))
+
+    def subscribe(self, chat_id: str, last_seq: Optional[int] = None) -> _Connection:
+        """Queue-backed subscriber for transports without a socket, e.g. SSE"""
+        connection = _Connection()
+        self._attach(chat_id, connection, connection, last_seq)
+        return connection
+
+    def _attach(self, chat_id: str, key: object, connection: _Connection, last_seq: Optional[int]):
         if chat_id not in self.active_connections:
             self.active_connections[chat_id] = []
-        self.active_connections[chat_id].append(websocket)
-    
-    def disconnect(self, websocket: WebSocket, chat_id: str):
-        if chat_id in self.active_connections:
+        self.active_connections[chat_id].append(key)
+        self._connections[key] = connection
+
+        if last_seq is not None:
+            missed = self.replay.since(chat_id, last_seq)
+            if missed is None:
+                # The gap is no longer buffered; the client reloads the history instead
+                reset = {"type": "reset", "seq": self.replay.last_seq(chat_id)}
+                missed = [(reset, json.dumps(reset))]
+            for message, text in missed:
+                connection.enqueue(message, text)
+
+    def last_seq(self, chat_id: str) -> int:
+        return self.replay.last_seq(chat_id)
+
+    def disconnect(self, websocket: object, chat_id: str):
+        connection = self._connections.pop(websocket, None)
+        if connection is not None:
+            # Frames nobody will read; SSE subscribers have no writer to discard them
+            websocket_queued.dec(len(connection.queue))
+            connection.queue.clear()
+            if connection.writer is not None and not connection.writer.done():
+                connection.writer.cancel()
+        if chat_id in self.active_connections and websocket in self.active_connections[chat_id]:
             self.active_connections[chat_id].remove(websocket)
             if not self.active_connections[chat_id]:
                 del self.active_connections[chat_id]
-    
+
+    def queue_depths(self) -> Dict[str, List[int]]:
+        """Queued frames per connection, by chat"""
+        return {
+            chat_id: [len(self._connections[ws].queue) for ws in sockets if ws in self._connections]
+            for chat_id, sockets in self.active_connections.items()
+        }
+
     async def send_provider_token(self, chat_id: str, provider: str, token: str, done: bool = False):
-        if chat_id in self.active_connections:
-            message = {
-                "type": "provider",
-                "provider": provider,
-                "token": token,
-                "done": done
-            }
-            await self._broadcast(chat_id, message)
-    
+        self._send_batched(chat_id, "provider", provider, token, done)
+
     async def send_synth_token(self, chat_id: str, token: str, done: bool = False):
+        self._send_batched(chat_id, "synth", None, token, done)
+
+    def _frame(self, kind: str, provider: Optional[str], token: str, done: bool) -> dict:
+        if kind == "provider":
+            return {"type": "provider", "provider": provider, "token": token, "done": done}
+        return {"type": "synth", "token": token, "done": done}
+
+    def _send_batched(self, chat_id: str, kind: str, provider: Optional[str], token: str, done: bool):
+        """Merge tokens into one frame per window or byte threshold; `done` flushes at once"""
+        window = settings.WS_BATCH_WINDOW_MS / 1000
+        key = (chat_id, kind, provider)
+        batch = self._batches.get(key)
+        if batch is None:
+            if done or window <= 0:
+                self._broadcast(chat_id, self._frame(kind, provider, token, done))
+                return
+            batch = self._batches[key] = _Batch()
+
+        batch.tokens.append(token)
+        batch.size += len(token)
+        if done or batch.size >= settings.WS_BATCH_MAX_BYTES:
+            self._flush(key, done)
+        elif batch.timer is None:
+            batch.timer = asyncio.get_running_loop().call_later(window, self._flush, key)
+
+    def flush(self, chat_id: str):
+        """Send every pending batch for a chat now"""
+        for key in [key for key in self._batches if key[0] == chat_id]:
+            self._flush(key)
+
+    def _flush(self, key: Tuple[str, str, Optional[str]], done: bool = False):
+        batch = self._batches.pop(key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        chat_id, kind, provider = key
+        self._broadcast(chat_id, self._frame(kind, provider, "".join(batch.tokens), done))
+
+    def _broadcast(self, chat_id: str, message: dict):
+        """Sequence, serialize once and queue for every subscriber; never waits on the network"""
+        message, text = self.replay.record(chat_id, message, json.dumps)
+        self._deliver(chat_id, message, text)
+        self.pubsub.publish(self.node_id, chat_id, text)
+
+    def _deliver(self, chat_id: str, message: dict, text: str):
         if chat_id in self.active_connections:
-            message = {
-                "type": "synth",
-                "token": token,
-                "done": done
-            }
-            await self._broadcast(chat_id, message)
-    
-    async def _broadcast(self, chat_id: str, message: dict):
-        if chat_id in self.active_connections:
+            data = None
             disconnected = []
             for websocket in self.active_connections[chat_id]:
-                try:
-                    await websocket.send_text(json.dumps(message))
-                except:
+                connection = self._connections.get(websocket)
+                if connection is None or connection.closed:
                     disconnected.append(websocket)
-            
+                    continue
+                if connection.codec is not None and data is None:
+                    # Encode once for every binary subscriber
+                    data = self.codec.encode(message)
+                if not connection.enqueue(message, text, data):
+                    # Too far behind; close it so the client reconnects
+                    connection.close(code=1013)
+                    disconnected.append(websocket)
+
             for websocket in disconnected:
                 self.disconnect(websocket, chat_id)
 
-websocket_manager = ConnectionManager()
\ No newline at end of file
+websocket_manager = ConnectionManager(create_pubsub(settings.STREAM_PUBSUB_URL))
\ No newline at end of file
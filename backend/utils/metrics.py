@@ -0,0 +1,212 @@
+import asyncio
+import bisect
+import time
+from typing import AsyncGenerator, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 200, 500)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self.values.get(tuple(str(labels[name]) for name in self.labels), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+class Gauge:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str):
+        self.values[tuple(str(labels[name]) for name in self.labels)] = value
+
+    def get(self, **labels: str) -> float:
+        return self.values.get(tuple(str(labels[name]) for name in self.labels), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> (per-bucket counts, sum, count)
+        self.values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labels)
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            entry[0][index] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """In-process metrics rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        if name not in self._metrics:
+            self._metrics[name] = Counter(name, help_text, labels)
+        return self._metrics[name]
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        if name not in self._metrics:
+            self._metrics[name] = Gauge(name, help_text, labels)
+        return self._metrics[name]
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        if name not in self._metrics:
+            self._metrics[name] = Histogram(name, help_text, labels, buckets)
+        return self._metrics[name]
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+provider_requests = metrics.counter(
+    "provider_requests_total", "Provider generate streams", ["provider", "mode", "outcome"]
+)
+provider_tokens = metrics.counter(
+    "provider_tokens_total", "Tokens streamed from providers", ["provider", "mode"]
+)
+provider_ttft = metrics.histogram(
+    "provider_time_to_first_token_seconds", "Time to first token", ["provider", "mode"]
+)
+provider_duration = metrics.histogram(
+    "provider_stream_duration_seconds", "Total stream duration", ["provider", "mode", "outcome"]
+)
+provider_token_rate = metrics.histogram(
+    "provider_tokens_per_second", "Streaming rate per response", ["provider", "mode"], RATE_BUCKETS
+)
+provider_token_gap = metrics.histogram(
+    "provider_inter_token_gap_seconds", "Gap between consecutive tokens", ["provider", "mode"]
+)
+
+class StreamMetrics:
+    """Measures one provider token stream and records it in the registry"""
+
+    def __init__(self, provider: str, mode: str):
+        self.provider = provider
+        self.mode = mode
+        self.ttft: Optional[float] = None
+        self.duration: Optional[float] = None
+        self.token_count = 0
+        self.outcome: Optional[str] = None
+        # "cache" or "joined" when the tokens were replayed rather than streamed
+        # from the provider; those say nothing about its latency or errors
+        self.source = "upstream"
+
+    def mark(self, source: str):
+        self.source = source
+
+    async def track(self, stream: AsyncIterator[str]) -> AsyncGenerator[str, None]:
+        started = last = time.perf_counter()
+        outcome = "error"
+        try:
+            async for token in stream:
+                now = time.perf_counter()
+                if self.ttft is None:
+                    self.ttft = now - started
+                else:
+                    provider_token_gap.observe(now - last, provider=self.provider, mode=self.mode)
+                last = now
+                self.token_count += 1
+                yield token
+            outcome = "success"
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            raise
+        finally:
+            self.duration = time.perf_counter() - started
+            self._record(outcome)
+
+    @property
+    def tokens_per_sec(self) -> Optional[float]:
+        if not self.duration or not self.token_count:
+            return None
+        return self.token_count / self.duration
+
+    def _record(self, outcome: str):
+        self.outcome = outcome
+        if self.source != "upstream":
+            return
+        labels = {"provider": self.provider, "mode": self.mode}
+        provider_requests.inc(outcome=outcome, **labels)
+        provider_duration.observe(self.duration, outcome=outcome, **labels)
+        provider_tokens.inc(self.token_count, **labels)
+        if self.ttft is not None:
+            provider_ttft.observe(self.ttft, **labels)
+        if self.tokens_per_sec is not None:
+            provider_token_rate.observe(self.tokens_per_sec, **labels)
+
+    def as_columns(self) -> dict:
+        """Values for the ProviderResponse timing columns"""
+        return {
+            "response_time": round(self.duration * 1000) if self.duration is not None else None,
+            "ttft": round(self.ttft * 1000) if self.ttft is not None else None,
+            "token_count": self.token_count,
+            "tokens_per_sec": self.tokens_per_sec
+        }
@@ -0,0 +1,53 @@
+from typing import List, Optional
+
+class SSEDecoder:
+    """Incremental byte-level Server-Sent Events parser
+
+    Feed raw response bytes as they arrive; complete events come back as their
+    `data` payload (multi-line data joined with newlines). Comments such as
+    keep-alives and events without data are dropped.
+    """
+
+    def __init__(self):
+        self._buffer = b""
+        self._data: List[bytes] = []
+
+    def feed(self, chunk: bytes) -> List[str]:
+        buffer = self._buffer + chunk
+        if b"\r" in buffer:
+            # Hold back a trailing CR: it may be the first half of a CRLF
+            held = buffer.endswith(b"\r")
+            if held:
+                buffer = buffer[:-1]
+            buffer = buffer.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+            if held:
+                buffer += b"\r"
+
+        lines = buffer.split(b"\n")
+        self._buffer = lines.pop()
+        events = []
+        for line in lines:
+            if not line:
+                # A blank line dispatches the pending event
+                if self._data:
+                    events.append(b"\n".join(self._data).decode("utf-8"))
+                    self._data = []
+            elif line.startswith(b"data:"):
+                value = line[5:]
+                self._data.append(value[1:] if value.startswith(b" ") else value)
+            # Comments (":") and the event/id/retry fields are not used
+        return events
+
+def encode_event(data: str, event_id: Optional[int] = None, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Event; multi-line data becomes several data fields"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    lines.extend("data: " + line for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+def encode_comment(text: str = "") -> str:
+    """An SSE comment, ignored by clients; used as a keep-alive"""
+    return f": {text}\n\n"
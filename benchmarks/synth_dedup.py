@@ -0,0 +1,59 @@
+"""Synthesis time as responses get longer and providers more numerous
+
+Builds responses that restate a shared pool of points in slightly different
+words, plus points of their own, and times the sentence clustering that
+picks the synthesis insights. Time per word should stay flat as the
+responses grow:
+
+    PYTHONPATH=backend:. python -m benchmarks.synth_dedup --providers 4,20 --words 1000,10000
+"""
+import argparse
+import random
+import time
+from typing import List
+from backend.aggregator.dedup import SentenceClusters
+from backend.aggregator.synth import MAX_INSIGHTS
+
+VOCABULARY = [f"term{i}" for i in range(5000)]
+
+def sentence(rng: random.Random, words: int = 14) -> List[str]:
+    return rng.sample(VOCABULARY, words)
+
+def responses(providers: int, words: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    shared = [sentence(rng) for _ in range(max(1, words // 40))]
+    texts = []
+    for _ in range(providers):
+        parts, total = [], 0
+        while total < words:
+            if rng.random() < 0.5:
+                # A shared point with one word swapped, as another provider might put it
+                words_in = list(rng.choice(shared))
+                words_in[rng.randrange(len(words_in))] = rng.choice(VOCABULARY)
+            else:
+                words_in = sentence(rng)
+            parts.append(" ".join(words_in).capitalize() + ".")
+            total += len(words_in)
+        texts.append(" ".join(parts))
+    return texts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--providers", default="4,20", help="comma-separated provider counts")
+    parser.add_argument("--words", default="1000,10000", help="comma-separated words per response")
+    args = parser.parse_args()
+
+    print(f"{'providers':>9} {'words':>7} {'sentences':>10} {'clusters':>9} {'ms':>9} {'us/word':>8}")
+    for providers in map(int, args.providers.split(",")):
+        for words in map(int, args.words.split(",")):
+            texts = responses(providers, words)
+            started = time.perf_counter()
+            clusters = SentenceClusters(texts)
+            clusters.novel_sentences(MAX_INSIGHTS)
+            elapsed = time.perf_counter() - started
+            total_words = sum(len(text.split()) for text in texts)
+            print(f"{providers:>9} {words:>7} {len(clusters.sentences):>10} {len(clusters.clusters()):>9} "
+                  f"{elapsed * 1000:>9.1f} {elapsed / total_words * 1e6:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Bytes per answer and CPU per frame for the WebSocket framing options
+
+Simulates one aggregate answer (every provider streaming, then the synthesis)
+and encodes each token event as JSON text or as a binary frame, with and
+without permessage-deflate (raw deflate, context takeover, one sync flush per
+message, as browsers negotiate it by default):
+
+    PYTHONPATH=backend:. python -m benchmarks.ws_framing --tokens 400
+"""
+import argparse
+import json
+import random
+import time
+import zlib
+from typing import Callable, List
+from backend.streaming.framing import BinaryCodec
+
+WORDS = [
+    "the", "model", "response", "stream", "token", "latency", "provider", "answer",
+    "context", "quality", "first", "second", "finally", "because", "network", "result"
+]
+
+def answer_events(providers: List[str], tokens: int, seed: int = 0) -> List[dict]:
+    rng = random.Random(seed)
+    events = []
+    seq = 0
+    for i in range(tokens):
+        for provider in providers:
+            seq += 1
+            events.append({"type": "provider", "provider": provider, "token": rng.choice(WORDS) + " ",
+                           "done": False, "seq": seq})
+    for provider in providers:
+        seq += 1
+        events.append({"type": "provider", "provider": provider, "token": "", "done": True, "seq": seq})
+    for i in range(tokens):
+        seq += 1
+        events.append({"type": "synth", "token": rng.choice(WORDS) + " ", "done": False, "seq": seq})
+    return events
+
+def measure(name: str, encode: Callable[[dict], bytes], events: List[dict], deflate: bool) -> dict:
+    compressor = zlib.compressobj(wbits=-15) if deflate else None
+    total = 0
+    started = time.perf_counter()
+    for event in events:
+        frame = encode(event)
+        if compressor is not None:
+            # permessage-deflate strips the trailing 00 00 ff ff of each sync flush
+            frame = (compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH))[:-4]
+        total += len(frame)
+    elapsed = time.perf_counter() - started
+    return {
+        "framing": name + (" + deflate" if deflate else ""),
+        "bytes": total,
+        "bytes_per_frame": total / len(events),
+        "us_per_frame": elapsed / len(events) * 1e6
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=400, help="tokens per provider and for the synthesis")
+    parser.add_argument("--providers", default="openai,groq,deepseek,gemini")
+    args = parser.parse_args()
+
+    providers = args.providers.split(",")
+    codec = BinaryCodec(providers)
+    events = answer_events(providers, args.tokens)
+    encoders = [
+        ("json", lambda event: json.dumps(event).encode("utf-8")),
+        ("binary", codec.encode)
+    ]
+    results = [measure(name, encode, events, deflate) for name, encode in encoders for deflate in [False, True]]
+
+    baseline = results[0]["bytes"]
+    print(f"{len(events)} frames per answer")
+    print(f"{'framing':<18} {'bytes/answer':>13} {'bytes/frame':>12} {'vs json':>8} {'us/frame':>9}")
+    for result in results:
+        print(f"{result['framing']:<18} {result['bytes']:>13} {result['bytes_per_frame']:>12.1f} "
+              f"{result['bytes'] / baseline:>8.0%} {result['us_per_frame']:>9.2f}")
+
+if __name__ == "__main__":
+    main()
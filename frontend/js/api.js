@@ -4,6 +4,10 @@ class ChatAPI {
         this.baseURL = window.location.origin;
         this.ws = null;
         this.currentChatId = null;
+        this.lastSeq = null;
+        // Provider names by index, sent in the hello frame of a binary connection
+        this.providerTable = [];
+        this.textDecoder = new TextDecoder();
     }
 
     async createChat(title = "New Chat") {
@@ -54,7 +58,7 @@ class ChatAPI {
 
     async getChatHistory(chatId) {
         try {
-            const response = await fetch(`${this.baseURL}/api/chat/${chatId}/history`);
+            const response = await fetch(`${this.baseURL}/api/chat/${chatId}/history?provider_bodies=false`);
             
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
@@ -88,11 +92,18 @@ class ChatAPI {
         }
     }
 
-    connectWebSocket(chatId, onMessage) {
+    connectWebSocket(chatId, onMessage, lastSeq = null) {
         const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-        const wsUrl = `${protocol}//${window.location.host}/ws/chat/${chatId}`;
+        // With last_seq the server replays every event after it, so nothing is lost
+        // between sending a message and connecting, or across a reconnect
+        const query = lastSeq !== null ? `&last_seq=${lastSeq}` : '';
+        const wsUrl = `${protocol}//${window.location.host}/ws/chat/${chatId}?encoding=binary${query}`;
         
-        this.ws = new WebSocket(wsUrl);
+        this.disconnectWebSocket();
+        this.lastSeq = lastSeq;
+        const ws = new WebSocket(wsUrl);
+        ws.binaryType = 'arraybuffer';
+        this.ws = ws;
         
         this.ws.onopen = () => {
             console.log('WebSocket connected');
@@ -100,7 +111,16 @@ class ChatAPI {
         
         this.ws.onmessage = (event) => {
             try {
-                const data = JSON.parse(event.data);
+                const data = typeof event.data === 'string'
+                    ? JSON.parse(event.data)
+                    : this.decodeFrame(event.data);
+                if (data.type === 'hello') {
+                    this.providerTable = data.providers;
+                    return;
+                }
+                if (data.seq !== undefined) {
+                    this.lastSeq = data.seq;
+                }
                 onMessage(data);
             } catch (error) {
                 console.error('Error parsing WebSocket message:', error);
@@ -109,6 +129,14 @@ class ChatAPI {
         
         this.ws.onclose = () => {
             console.log('WebSocket disconnected');
+            // Reconnect unless we closed it ourselves, resuming after the last event seen
+            if (this.ws === ws && this.lastSeq !== null) {
+                setTimeout(() => {
+                    if (this.ws === ws) {
+                        this.connectWebSocket(chatId, onMessage, this.lastSeq);
+                    }
+                }, 1000);
+            }
         };
         
         this.ws.onerror = (error) => {
@@ -118,10 +146,32 @@ class ChatAPI {
         return this.ws;
     }
 
+    decodeFrame(buffer) {
+        // Binary frame: kind, flags, provider index (1 byte each), seq (uint32 BE),
+        // then the UTF-8 token; kind 2 carries a JSON event instead
+        const view = new DataView(buffer);
+        const kind = view.getUint8(0);
+        const flags = view.getUint8(1);
+        const index = view.getUint8(2);
+        const seq = view.getUint32(3);
+        const payload = this.textDecoder.decode(new Uint8Array(buffer, 7));
+        if (kind === 2) {
+            return JSON.parse(payload);
+        }
+        const message = kind === 0
+            ? { type: 'provider', provider: this.providerTable[index] }
+            : { type: 'synth' };
+        message.token = payload;
+        message.done = (flags & 1) !== 0;
+        message.seq = seq;
+        return message;
+    }
+
     disconnectWebSocket() {
         if (this.ws) {
-            this.ws.close();
+            const ws = this.ws;
             this.ws = null;
+            ws.close();
         }
     }
 }
\ No newline at end of file
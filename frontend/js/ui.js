@@ -104,17 +104,17 @@ class ChatUI {
             this.currentChatId = response.chat_id;
             
             // Connect WebSocket for streaming
-            this.setupStreaming(mode);
+            this.setupStreaming(mode, response.last_seq);
             
         } catch (error) {
             this.showError('Failed to send message');
         }
     }
 
-    setupStreaming(mode) {
+    setupStreaming(mode, lastSeq = null) {
         this.api.connectWebSocket(this.currentChatId, (data) => {
             this.handleStreamEvent(data, mode);
-        });
+        }, lastSeq);
 
         // Create provider containers based on mode
         this.createProviderContainers(mode);
@@ -161,6 +161,9 @@ class ChatUI {
             this.updateProviderResponse(provider, token, done);
         } else if (type === 'synth') {
             this.updateSynthResponse(token, done, mode);
+        } else if (type === 'reset') {
+            // Missed events are no longer buffered on the server; reload the chat
+            this.loadChat(this.currentChatId);
         }
     }
 
@@ -0,0 +1,24 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import pytest
+
+# Engines are built from DATABASE_URL on import, so point it at a scratch
+# database before anything imports backend.db; ./chat.db stays untouched
+DATABASE_DIR = tempfile.mkdtemp(prefix="chat-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(DATABASE_DIR, 'chat.db')}"
+
+from backend.db import close_db, init_db
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    """A fresh schema for the session, removed afterwards
+
+    Pooled aiosqlite connections hold threads that would keep pytest from
+    exiting, so they are closed first.
+    """
+    asyncio.run(init_db())
+    yield
+    asyncio.run(close_db())
+    shutil.rmtree(DATABASE_DIR, ignore_errors=True)
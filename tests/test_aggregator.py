@@ -1,4 +1,6 @@
 import pytest
+import asyncio
+from config import settings
 from backend.aggregator.synth import Synthesizer
 
 def test_synthesizer_basic():
@@ -28,4 +30,123 @@ def test_synthesizer_single_response():
     }
     
     result = synthesizer.synthesize(responses)
-    assert "Single response content" in result
\ No newline at end of file
+    assert "Single response content" in result
+
+RESPONSES = {
+    "openai": "Python is a programming language. It is widely used for data science and web development.",
+    "groq": "Python is popular because it is readable. Its ecosystem includes numpy, pandas and Django frameworks for many tasks.",
+    "deepseek": "Short answer."
+}
+
+def test_synthesis_streams_the_same_answer_in_parts():
+    synthesizer = Synthesizer()
+    parts = list(synthesizer.synthesize_stream(RESPONSES))
+    assert "".join(parts) == synthesizer.synthesize(RESPONSES)
+    assert parts[0] in RESPONSES.values()
+
+@pytest.mark.asyncio
+async def test_synth_pacing_is_off_by_default(monkeypatch):
+    from backend.routers.chat import paced
+
+    started = asyncio.get_running_loop().time()
+    assert [piece async for piece in paced("x" * 1000)] == ["x" * 1000]
+    assert asyncio.get_running_loop().time() - started < 0.01
+
+    monkeypatch.setattr(settings, "SYNTH_PACING_CHARS_PER_SEC", 2000)
+    pieces = [piece async for piece in paced("x" * 200)]
+    assert "".join(pieces) == "x" * 200 and len(pieces) == 2
+
+def test_incremental_ranking_matches_rank_responses():
+    from backend.aggregator.rank import IncrementalRanker, ResponseRanker
+
+    responses = {
+        "openai": "Short answer.",
+        "groq": "First, split the work. Second, measure it! Finally, according to the docs... ship it? " * 6,
+        "deepseek": " ".join(["word"] * 60) + ". Based on research shows nothing.",
+        "gemini": "Research sho" + "ws that in concl" + "usion it works."
+    }
+    ranker = IncrementalRanker()
+    for provider, response in responses.items():
+        features = ranker.stream(provider)
+        # Uneven token boundaries, splitting words, markers and "..." runs
+        for i in range(0, len(response), 7):
+            features.feed(response[i:i + 7])
+    assert ranker.rank(responses) == ResponseRanker.rank_responses(responses)
+
+def test_batch_ranking_matches_the_single_call_path():
+    np = pytest.importorskip("numpy")
+    from backend.aggregator.batch import BatchRanker, synthesize_batch
+    from backend.aggregator.rank import ResponseRanker, response_features
+
+    random = np.random.default_rng(7)
+    vocabulary = ["word", "First,", "In", "CONCLUSION", "based", "on", "end.", "wait...", "ok?!",
+                  "\u00a0", "\u2003", "K", "\u212a", "f\u0130rst", "research", "shows", "", "\n"]
+    group_ids, providers, texts = [], [], []
+    for message in range(40):
+        for provider in ["openai", "groq", "deepseek", "gemini"][:random.integers(1, 5)]:
+            words = random.choice(vocabulary, size=random.integers(0, 400))
+            group_ids.append(f"message-{message}")
+            providers.append(provider)
+            texts.append(" ".join(words))
+
+    features = BatchRanker().features(texts)
+    for i, text in enumerate(texts):
+        assert (features["word_count"][i], features["sentence_count"][i],
+                features["structure"][i], features["citation"][i]) == response_features(text)
+
+    synthesizer = Synthesizer()
+    results = list(synthesize_batch(group_ids, providers, texts))
+    assert len(results) == 40
+    for group_id, ranking, synthesized in results:
+        responses = {p: t for g, p, t in zip(group_ids, providers, texts) if g == group_id}
+        assert [responses[p] for p in ranking] == ResponseRanker.rank_responses(responses)
+        assert synthesized == synthesizer.synthesize(responses)
+
+def test_dedup_clusters_near_duplicate_sentences_across_providers():
+    from backend.aggregator.dedup import SentenceClusters
+
+    base = "Caching cuts latency for repeated prompts. Streaming shows tokens as they arrive."
+    shared = "Batching requests to the provider reduces the overhead of every network round trip"
+    responses = [base]
+    for i in range(24):
+        # Every provider words the shared point a little differently
+        responses.append(f"Streaming shows tokens as they arrive. {shared} {'today' if i % 2 else 'a lot'}. "
+                         "Only this provider notes " + " ".join(f"w{i * 10 + j}" for j in range(10)) + ".")
+    responses.append("A rarely mentioned idea is that warm connection pools avoid TLS handshakes.")
+
+    clusters = SentenceClusters(responses)
+    roots = clusters.clusters()
+    # Base, the shared point, 24 provider-specific sentences, and the rare idea
+    assert len(roots) == 2 + 1 + 24 + 1
+    novel = clusters.novel_sentences(2)
+    assert novel[0].startswith(shared)
+    assert not any(sentence.startswith("Streaming") for sentence in novel)
+
+    parts = list(Synthesizer().synthesize_stream(dict(enumerate(responses)), responses))
+    assert parts == [base, "\n\nAdditionally: " + " ".join(novel)]
+
+
+@pytest.mark.asyncio
+async def test_batch_streams_responses_in_creation_order():
+    from datetime import datetime, timedelta
+    from backend.aggregator.batch import stream_provider_responses
+    from backend.db import AsyncSessionLocal, init_db
+    from backend.models import ProviderResponse
+
+    await init_db()
+    started = datetime(2024, 1, 1)
+    async with AsyncSessionLocal() as db:
+        # Inserted in reverse; the stream must follow created_at, not insertion
+        for message_id in ["batch-order-b", "batch-order-a"]:
+            for offset, provider in reversed(list(enumerate(["openai", "groq", "deepseek"]))):
+                db.add(ProviderResponse(message_id=message_id, provider=provider, content=provider,
+                                        created_at=started + timedelta(seconds=offset)))
+        await db.commit()
+
+    seen = {}
+    async for message_ids, providers, _ in stream_provider_responses(chunk_size=2):
+        for message_id, provider in zip(message_ids, providers):
+            if message_id.startswith("batch-order-"):
+                seen.setdefault(message_id, []).append(provider)
+    assert list(seen) == ["batch-order-a", "batch-order-b"]
+    assert all(order == ["openai", "groq", "deepseek"] for order in seen.values())
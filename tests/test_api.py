@@ -1,6 +1,9 @@
 import pytest
+import asyncio
 from fastapi.testclient import TestClient
 from backend.main import app
+from backend.providers.base import ProviderClient
+from config import settings
 
 client = TestClient(app)
 
@@ -28,4 +31,354 @@ def test_rating_invalid_score():
         "message_id": "test", 
         "score": 2  # Invalid score
     })
-    assert response.status_code == 400
\ No newline at end of file
+    assert response.status_code == 400
+
+class SlowProvider(ProviderClient):
+    def __init__(self, name: str, delay: float):
+        self.name = name
+        self.delay = delay
+
+    async def generate(self, prompt: str):
+        await asyncio.sleep(self.delay)
+        yield f"{self.name} answer."
+
+    def is_configured(self) -> bool:
+        return True
+
+    def get_name(self) -> str:
+        return self.name
+
+@pytest.mark.asyncio
+async def test_aggregate_early_synthesis_with_quorum(monkeypatch):
+    from sqlalchemy import select
+    from backend.db import init_db, AsyncSessionLocal
+    from backend.models import Message, ProviderResponse
+    from backend.persistence import persistence
+    from backend.routers import chat
+    from backend.schemas import AggregatePolicy
+
+    await init_db()
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "SIMILAR_PROMPT_CACHE_ENABLED", False)
+    monkeypatch.setattr(chat, "active_providers", {
+        "fast1": SlowProvider("fast1", 0.01),
+        "fast2": SlowProvider("fast2", 0.02),
+        "slow": SlowProvider("slow", 0.5)
+    })
+    policy = AggregatePolicy(deadline=5, quorum=2, early_synthesis=True, stragglers="persist")
+    chat_id = client.post("/api/chat/new", json={"title": "Quorum"}).json()["id"]
+
+    started = asyncio.get_running_loop().time()
+    task = asyncio.create_task(
+        chat.process_aggregated_response(chat_id, "user-message", "Hello", policy)
+    )
+    # Synthesis must not wait for the slow provider
+    await asyncio.sleep(0.3)
+    await persistence.flush()
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(ProviderResponse.provider)
+            .join(Message, Message.id == ProviderResponse.message_id)
+            .where(Message.chat_id == chat_id)
+        )
+        saved = set(result.scalars().all())
+    assert {"fast1", "fast2"} <= saved
+
+    await task
+    assert asyncio.get_running_loop().time() - started >= 0.5
+    await persistence.flush()
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(ProviderResponse.provider)
+            .join(Message, Message.id == ProviderResponse.message_id)
+            .where(Message.chat_id == chat_id)
+        )
+        assert "slow" in set(result.scalars().all())
+
+def test_aggregate_policy_rejects_non_positive_overrides():
+    from backend.routers.chat import build_aggregate_policy
+    from backend.schemas import MessageSend
+
+    for override in [{"deadline": 0}, {"deadline": -1}, {"quorum": 0}, {"quorum": -1}]:
+        response = client.post("/api/chat/send", json={"message": "Hi", **override})
+        assert response.status_code == 422
+    policy = build_aggregate_policy(MessageSend(message="Hi", deadline=2.5, quorum=1))
+    assert (policy.deadline, policy.quorum) == (2.5, 1)
+    assert build_aggregate_policy(MessageSend(message="Hi")).deadline == settings.AGGREGATE_DEADLINE
+
+def test_metrics_endpoint():
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE provider_requests_total counter" in response.text
+
+@pytest.mark.asyncio
+async def test_send_message_streams_sse_in_one_request(monkeypatch):
+    import httpx
+    import json
+    from backend.db import init_db
+    from backend.routers import chat
+
+    await init_db()
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setattr(chat, "active_providers", {"fast": SlowProvider("fast", 0.01)})
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        response = await http.post("/api/chat/send", json={"message": "Hi", "mode": "multiple", "stream": True})
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = [
+        json.loads(line[len("data: "):]) for line in response.text.split("\n") if line.startswith("data: ")
+    ]
+    assert events[0]["type"] == "start"
+    tokens = [event for event in events[1:] if event["type"] == "provider"]
+    assert "".join(event["token"] for event in tokens) == "fast answer."
+    assert tokens[-1]["done"] is True
+    assert "id: %d" % tokens[-1]["seq"] in response.text
+
+@pytest.mark.asyncio
+async def test_chat_history_pages_by_cursor_in_constant_queries():
+    import httpx
+    from datetime import datetime, timedelta
+    from sqlalchemy import event
+    from backend.db import init_db, AsyncSessionLocal, read_engine
+    from backend.models import Chat, Message, ProviderResponse
+
+    await init_db()
+    started = datetime(2024, 1, 1)
+    async with AsyncSessionLocal() as db:
+        chat = Chat(title="Paging")
+        db.add(chat)
+        await db.flush()
+        for i in range(9):
+            # The last two share a timestamp, so id breaks the tie
+            message = Message(chat_id=chat.id, content=f"message {i}", is_user=i % 2 == 0,
+                              created_at=started + timedelta(seconds=min(i, 7)))
+            db.add(message)
+            await db.flush()
+            if not message.is_user:
+                for provider in ["openai", "groq"]:
+                    db.add(ProviderResponse(message_id=message.id, provider=provider, content=f"{provider} {i}"))
+        await db.commit()
+        chat_id = chat.id
+
+    statements = []
+    def count(*args):
+        statements.append(args)
+    event.listen(read_engine.sync_engine, "before_cursor_execute", count)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        full = (await http.get(f"/api/chat/{chat_id}/history")).json()
+        assert len(statements) == 3
+        expected = [message["content"] for message in full["messages"]]
+        assert sorted(expected) == [f"message {i}" for i in range(9)]
+        assert len(full["provider_responses"]) == 8 and not full["has_more"]
+
+        # Newest first pages, walking back
+        pages, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"before": cursor} if cursor else {})}
+            page = (await http.get(f"/api/chat/{chat_id}/history", params=params)).json()
+            pages.insert(0, [message["content"] for message in page["messages"]])
+            ids = {message["id"] for message in page["messages"] if not message["is_user"]}
+            assert {response["message_id"] for response in page["provider_responses"]} == ids
+            cursor = page["before_cursor"]
+            if not page["has_more"]:
+                break
+        assert sum(pages, []) == expected
+
+        # Without provider bodies, then everything older, then forward again
+        page = (await http.get(f"/api/chat/{chat_id}/history", params={"limit": 4, "provider_bodies": "false"})).json()
+        assert page["provider_responses"] and all(response["content"] is None for response in page["provider_responses"])
+        older = (await http.get(f"/api/chat/{chat_id}/history", params={"before": page["before_cursor"]})).json()
+        assert [m["content"] for m in older["messages"] + page["messages"]] == expected
+        newer = (await http.get(f"/api/chat/{chat_id}/history", params={"after": older["after_cursor"], "limit": 4})).json()
+        assert newer["messages"] == page["messages"] and not newer["has_more"]
+
+        assert (await http.get(f"/api/chat/{chat_id}/history", params={"before": "!"})).status_code == 400
+    event.remove(read_engine.sync_engine, "before_cursor_execute", count)
+
+@pytest.mark.asyncio
+async def test_persistence_writes_concurrent_answers_in_one_transaction():
+    from sqlalchemy import event, func, select
+    from backend.db import init_db, AsyncSessionLocal, engine
+    from backend.models import Chat, Message, ProviderResponse
+    from backend.persistence import PersistenceQueue
+
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        chat = Chat(title="Write-behind")
+        db.add(chat)
+        await db.commit()
+        chat_id = chat.id
+
+    commits = []
+    def count(*args):
+        commits.append(args)
+    event.listen(engine.sync_engine, "commit", count)
+
+    queue = PersistenceQueue(max_size=100, batch_rows=100)
+    async def answer(i):
+        message = await queue.add(Message, chat_id=chat_id, content=f"answer {i}", is_user=False)
+        await queue.add(ProviderResponse, message_id=message["id"], provider="openai", content=f"answer {i}")
+        return message["id"]
+    ids = await asyncio.gather(*(answer(i) for i in range(20)))
+    await queue.flush()
+    event.remove(engine.sync_engine, "commit", count)
+
+    # The writer wakes for the first row; everything queued meanwhile goes in the next commit
+    assert len(commits) <= 2
+    assert queue.stats()["written"] == 40 and queue.stats()["queued"] == 0
+    async with AsyncSessionLocal() as db:
+        saved = (await db.execute(
+            select(func.count()).select_from(ProviderResponse).where(ProviderResponse.message_id.in_(ids))
+        )).scalar()
+    assert saved == 20
+    await queue.close()
+
+@pytest.mark.asyncio
+async def test_persistence_flush_waits_only_for_the_key_being_read():
+    from backend.db import init_db, AsyncSessionLocal, engine
+    from backend.models import Chat, Message
+    from backend.persistence import PersistenceQueue
+
+    # Waiting for a pooled connection is bound to the loop the pool was made on
+    await engine.dispose()
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        chat = Chat(title="Scoped flush")
+        db.add(chat)
+        await db.commit()
+        chat_id = chat.id
+
+    queue = PersistenceQueue(max_size=100, batch_rows=100)
+    # Holding the only write connection keeps the writer from committing
+    async with AsyncSessionLocal() as writer:
+        await writer.connection()
+        message = await queue.add(Message, keys=(chat_id,), chat_id=chat_id, content="queued", is_user=False)
+        await asyncio.wait_for(queue.flush("another-chat"), 1)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(asyncio.shield(queue.flush(chat_id)), 0.2)
+    await asyncio.wait_for(queue.flush(chat_id), 5)
+    await asyncio.wait_for(queue.flush(message["id"]), 1)
+    async with AsyncSessionLocal() as db:
+        assert (await db.get(Message, message["id"])).content == "queued"
+    await queue.close()
+
+@pytest.mark.asyncio
+async def test_persistence_fails_only_the_offending_rows_of_a_batch(capsys):
+    from backend.db import init_db, AsyncSessionLocal
+    from backend.models import Chat, Message, ProviderResponse
+    from backend.persistence import PersistenceQueue
+
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        chat = Chat(title="Bad row")
+        db.add(chat)
+        await db.commit()
+        chat_id = chat.id
+
+    queue = PersistenceQueue(max_size=100, batch_rows=100)
+    # Queued without yielding, so the writer takes all of them in one batch
+    good = await queue.add(Message, chat_id=chat_id, content="good", is_user=False)
+    bad = await queue.add(Message, chat_id=chat_id, content=None, is_user=False)
+    response = await queue.add(ProviderResponse, message_id=good["id"], provider="openai", content="good")
+    await queue.flush()
+
+    assert queue.stats()["failed"] == 1
+    async with AsyncSessionLocal() as db:
+        assert await db.get(Message, good["id"]) is not None
+        assert await db.get(Message, bad["id"]) is None
+        assert await db.get(ProviderResponse, response["id"]) is not None
+    assert f"messages row {bad['id']}" in capsys.readouterr().err
+    await queue.close()
+
+@pytest.mark.asyncio
+async def test_persistence_flush_returns_after_a_cancelled_add():
+    from backend.models import Message
+    from backend.persistence import PersistenceQueue
+
+    queue = PersistenceQueue(max_size=1, batch_rows=1)
+    release = asyncio.Event()
+    async def blocked_write(batch):
+        await release.wait()
+    queue._write = blocked_write
+
+    # One row held by the writer, one filling the queue, one waiting for room
+    await queue.add(Message, chat_id="chat", content="held", is_user=False)
+    await asyncio.sleep(0)
+    await queue.add(Message, chat_id="chat", content="queued", is_user=False)
+    waiting = asyncio.create_task(
+        queue.add(Message, keys=("cancelled-chat",), chat_id="cancelled-chat", content="never", is_user=False)
+    )
+    await asyncio.sleep(0)
+    waiting.cancel()
+    await asyncio.gather(waiting, return_exceptions=True)
+
+    await asyncio.wait_for(queue.flush("cancelled-chat"), 1)
+    release.set()
+    await asyncio.wait_for(queue.close(), 1)
+
+@pytest.mark.asyncio
+async def test_history_reads_do_not_wait_for_an_open_write():
+    import httpx
+    from backend.db import init_db, check_storage, AsyncSessionLocal
+    from backend.models import Chat, Message
+
+    await init_db()
+    profile = await check_storage()
+    assert profile["write"]["journal_mode"] == "wal" and profile["write"]["synchronous"] == "normal"
+    assert profile["read"]["query_only"] and not profile["write"]["query_only"]
+    assert profile["write"]["echo"] is False
+
+    async with AsyncSessionLocal() as db:
+        chat = Chat(title="WAL")
+        db.add(chat)
+        await db.flush()
+        db.add(Message(chat_id=chat.id, content="committed", is_user=True))
+        await db.commit()
+        chat_id = chat.id
+
+    transport = httpx.ASGITransport(app=app)
+    async with AsyncSessionLocal() as writer, httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        # A generation write holding SQLite's write lock
+        writer.add(Message(chat_id=chat_id, content="in flight", is_user=False))
+        await writer.flush()
+        response = await asyncio.wait_for(http.get(f"/api/chat/{chat_id}/history"), 2)
+        assert [message["content"] for message in response.json()["messages"]] == ["committed"]
+        await writer.rollback()
+
+@pytest.mark.asyncio
+async def test_init_db_upgrades_a_baseline_schema(tmp_path):
+    import sqlite3
+    from sqlalchemy import select
+    from backend.db import create_engine, migrate
+    from backend.models import ProviderResponse
+
+    # provider_responses as it was before stream metrics were recorded
+    path = tmp_path / "baseline.db"
+    baseline = sqlite3.connect(str(path))
+    baseline.executescript("""
+        CREATE TABLE provider_responses (
+            id VARCHAR(36) PRIMARY KEY, message_id VARCHAR(36) NOT NULL,
+            provider VARCHAR(50) NOT NULL, content TEXT NOT NULL,
+            response_time INTEGER, created_at DATETIME
+        );
+        INSERT INTO provider_responses VALUES ('r1', 'm1', 'openai', 'answer', 120, '2024-01-01 00:00:00');
+    """)
+    baseline.close()
+
+    upgraded = create_engine(f"sqlite+aiosqlite:///{path}", 1)
+    try:
+        for _ in range(2):
+            async with upgraded.begin() as conn:
+                await conn.run_sync(migrate)
+        async with upgraded.connect() as conn:
+            row = (await conn.execute(
+                select(ProviderResponse.response_time, ProviderResponse.ttft, ProviderResponse.tokens_per_sec)
+            )).one()
+    finally:
+        await upgraded.dispose()
+    assert tuple(row) == (120, None, None)
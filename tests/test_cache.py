@@ -0,0 +1,116 @@
+import pytest
+from backend.cache.response_cache import ResponseCache
+from backend.db import init_db
+from backend.providers.stubs import StubProvider
+
+
+class CountingProvider(StubProvider):
+    def __init__(self):
+        super().__init__("counting")
+        self.calls = 0
+
+    async def generate(self, prompt: str):
+        self.calls += 1
+        for token in ["cached ", "answer"]:
+            yield token
+
+
+@pytest.mark.asyncio
+async def test_response_cache_replays_normalized_prompt():
+    await init_db()
+    cache = ResponseCache(max_entries=10, max_bytes=1024, ttl=60)
+    await cache.invalidate("counting")
+    provider = CountingProvider()
+
+    first = [token async for token in cache.stream(provider, "What is  caching?")]
+    second = [token async for token in cache.stream(provider, "What is caching? ")]
+
+    assert first == second == ["cached ", "answer"]
+    assert provider.calls == 1
+    assert cache.stats()["memory_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_response_cache_falls_back_to_database():
+    await init_db()
+    writer = ResponseCache(max_entries=10, max_bytes=1024, ttl=60)
+    await writer.set("counting", "stub", "persisted prompt", ["from ", "sqlite"])
+
+    reader = ResponseCache(max_entries=10, max_bytes=1024, ttl=60)
+    assert await reader.get("counting", "stub", "persisted prompt") == ["from ", "sqlite"]
+    assert reader.stats()["db_hits"] == 1
+
+    assert await reader.invalidate("counting") >= 1
+    assert await reader.get("counting", "stub", "persisted prompt") is None
+
+
+def test_response_cache_evicts_by_size():
+    cache = ResponseCache(max_entries=10, max_bytes=10, ttl=60)
+    cache._remember("a", "p", ["12345"], float("inf"))
+    cache._remember("b", "p", ["67890"], float("inf"))
+    cache._remember("c", "p", ["abcde"], float("inf"))
+    assert list(cache._entries) == ["b", "c"]
+    assert cache.stats()["bytes"] == 10
+
+
+def test_similarity_index_matches_near_duplicates():
+    from backend.cache.similarity import SimilarityIndex, exact_features, minhash_signature
+
+    index = SimilarityIndex(threshold=0.8)
+    for prompt, answer in [("How do I reverse a list in Python?", "python-answer"),
+                           ("What is the capital of France?", "france-answer")]:
+        index.insert(minhash_signature(prompt), answer, exact_features(prompt))
+
+    assert index.lookup("how do I reverse a list in python")[0] == "python-answer"
+    assert index.lookup("WHAT IS THE CAPITAL OF FRANCE?!")[0] == "france-answer"
+    # One word added
+    assert index.lookup("What is the capital of France, please?")[0] == "france-answer"
+    assert index.lookup("How do I reverse a list in Python quickly?")[0] == "python-answer"
+    assert index.lookup("Explain quantum entanglement simply") is None
+
+
+def test_similarity_index_never_matches_a_different_number():
+    from backend.cache.similarity import SimilarityIndex, exact_features, minhash_signature
+
+    index = SimilarityIndex(threshold=0.85)
+    for prompt, answer in [("what is 12 times 13", "156"),
+                           ("In which year did Constantinople fall in 476", "wrong-year")]:
+        index.insert(minhash_signature(prompt), answer, exact_features(prompt))
+
+    # Both score about 0.9 on MinHash alone
+    assert index.lookup("what is 12 times 14") is None
+    assert index.lookup("In which year did Constantinople fall in 1453") is None
+    assert index.lookup("What is 12 times 13?")[0] == "156"
+
+
+@pytest.mark.asyncio
+async def test_similarity_index_backfills_and_persists():
+    from backend.cache.similarity import SimilarityIndex
+    from backend.db import AsyncSessionLocal
+    from backend.models import Chat, Message, ProviderResponse
+    from backend.persistence import persistence
+
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        chat = Chat()
+        db.add(chat)
+        await db.flush()
+        prompt = Message(chat_id=chat.id, content="Backfill me: unique similarity prompt", is_user=True)
+        db.add(prompt)
+        await db.flush()
+        answer = Message(chat_id=chat.id, content="Synthesized answer", is_user=False)
+        db.add(answer)
+        await db.flush()
+        for provider in ["openai", "groq"]:
+            db.add(ProviderResponse(message_id=answer.id, provider=provider, content=provider))
+        await db.commit()
+
+    index = SimilarityIndex(threshold=0.8)
+    await index.load()
+    assert index.lookup("backfill me unique similarity prompt")[0] == answer.id
+
+    # The signature was persisted, so a fresh index finds it without recomputing
+    await persistence.flush()
+    reloaded = SimilarityIndex(threshold=0.8)
+    await reloaded.load()
+    assert len(reloaded) == len(index)
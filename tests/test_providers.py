@@ -1,6 +1,8 @@
 import pytest
 import asyncio
 from backend.providers.stubs import StubProvider
+from backend.utils.errors import ProviderError
+from config import settings
 
 @pytest.mark.asyncio
 async def test_stub_provider():
@@ -33,4 +35,384 @@ async def test_provider_initialization():
     for provider in providers:
         assert hasattr(provider, 'is_configured')
         assert hasattr(provider, 'get_name')
-        assert hasattr(provider, 'generate')
\ No newline at end of file
+        assert hasattr(provider, 'generate')
+
+@pytest.mark.asyncio
+async def test_http_pool_reuses_client():
+    from backend.providers.http_pool import HTTPClientPool
+
+    pool = HTTPClientPool()
+    client = pool.get_client("deepseek")
+    assert pool.get_client("deepseek") is client
+    assert pool.get_client("openai") is not client
+
+    stats = pool.stats()
+    assert set(stats) == {"deepseek", "openai"}
+    assert stats["deepseek"]["connections"] == 0
+
+    await pool.close()
+    assert client.is_closed
+    assert pool.get_client("deepseek") is not client
+    await pool.close()
+
+
+class FlakyProvider(StubProvider):
+    def __init__(self, failures: int):
+        super().__init__("flaky")
+        self.failures = failures
+        self.calls = 0
+
+    async def generate(self, prompt: str):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ProviderError("flaky", "upstream unavailable", 503)
+        yield "ok"
+
+
+@pytest.mark.asyncio
+async def test_resilient_provider_retries_before_first_token(monkeypatch):
+    from backend.providers.resilience import ResilientProvider
+    monkeypatch.setattr(settings, "RETRY_BACKOFF", 0)
+
+    provider = ResilientProvider(FlakyProvider(failures=settings.MAX_RETRIES))
+    chunks = [chunk async for chunk in provider.generate("prompt")]
+    assert chunks == ["ok"]
+    assert provider.provider.calls == settings.MAX_RETRIES + 1
+    assert provider.breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_opens_and_probes(monkeypatch):
+    from backend.providers.resilience import ResilientProvider
+    monkeypatch.setattr(settings, "RETRY_BACKOFF", 0)
+    monkeypatch.setattr(settings, "MAX_RETRIES", 0)
+    monkeypatch.setattr(settings, "CIRCUIT_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(settings, "CIRCUIT_RESET_TIMEOUT", 0.05)
+
+    provider = ResilientProvider(FlakyProvider(failures=2))
+    for _ in range(2):
+        with pytest.raises(ProviderError):
+            [chunk async for chunk in provider.generate("prompt")]
+    assert not provider.is_available()
+    with pytest.raises(ProviderError) as error:
+        [chunk async for chunk in provider.generate("prompt")]
+    assert error.value.status_code == 503
+    assert provider.provider.calls == 2
+
+    # After the reset timeout a single probe is let through and closes the circuit
+    await asyncio.sleep(0.06)
+    assert provider.is_available()
+    chunks = [chunk async for chunk in provider.generate("prompt")]
+    assert chunks == ["ok"]
+    assert provider.breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_stream_metrics_measures_stream():
+    from backend.utils.metrics import StreamMetrics, metrics
+
+    stream_metrics = StreamMetrics("metrics-test", "single")
+    chunks = [chunk async for chunk in stream_metrics.track(StubProvider("test").generate("prompt"))]
+
+    columns = stream_metrics.as_columns()
+    assert columns["token_count"] == len(chunks)
+    assert 0 < columns["ttft"] <= columns["response_time"]
+    assert columns["tokens_per_sec"] > 0
+    rendered = metrics.render()
+    assert 'provider_requests_total{provider="metrics-test",mode="single",outcome="success"} 1' in rendered
+    assert 'provider_inter_token_gap_seconds_count{provider="metrics-test",mode="single"}' in rendered
+
+
+class SlowCountingProvider(StubProvider):
+    def __init__(self):
+        super().__init__("coalesced")
+        self.calls = 0
+
+    async def generate(self, prompt: str):
+        self.calls += 1
+        for token in ["one ", "two ", "three"]:
+            await asyncio.sleep(0.02)
+            yield token
+
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_identical_requests():
+    from backend.providers.singleflight import SingleFlight
+
+    flights = SingleFlight()
+    provider = SlowCountingProvider()
+
+    async def consume(delay: float):
+        await asyncio.sleep(delay)
+        stream = flights.stream(provider, "same prompt", lambda: provider.generate("same prompt"))
+        return [token async for token in stream]
+
+    # The late joiner arrives after the first token and still gets everything
+    results = await asyncio.gather(consume(0), consume(0), consume(0.03))
+    assert results == [["one ", "two ", "three"]] * 3
+    assert provider.calls == 1
+    assert flights.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_single_flight_propagates_errors():
+    from backend.providers.singleflight import SingleFlight
+
+    flights = SingleFlight()
+    provider = FlakyProvider(failures=1)
+    with pytest.raises(ProviderError):
+        [token async for token in flights.stream(provider, "p", lambda: provider.generate("p"))]
+    chunks = [token async for token in flights.stream(provider, "p", lambda: provider.generate("p"))]
+    assert chunks == ["ok"]
+
+
+@pytest.mark.asyncio
+async def test_admission_controller_limits_concurrency_and_orders_by_priority():
+    from backend.providers.admission import AdmissionController
+
+    controller = AdmissionController("limited", max_concurrency=1, rpm=0, tpm=0, max_queue=2)
+    admitted = []
+
+    async def request(name: str, priority: int):
+        await controller.acquire(10, priority)
+        admitted.append(name)
+        started = asyncio.get_running_loop().time()
+        await asyncio.sleep(0.01)
+        controller.release(started, 10, 10)
+
+    first = asyncio.create_task(request("first", 1))
+    await asyncio.sleep(0)
+    assert controller.active == 1
+    background = asyncio.create_task(request("background", 1))
+    interactive = asyncio.create_task(request("interactive", 0))
+    await asyncio.sleep(0)
+    assert controller.estimated_wait() > 0
+
+    # The queue is bounded
+    with pytest.raises(ProviderError) as error:
+        await controller.acquire(10)
+    assert error.value.status_code == 429
+
+    await asyncio.gather(first, background, interactive)
+    assert admitted == ["first", "interactive", "background"]
+    assert controller.active == 0
+
+
+@pytest.mark.asyncio
+async def test_admission_controller_frees_the_queue_of_cancelled_waiters():
+    from backend.providers.admission import AdmissionController
+
+    controller = AdmissionController("limited", max_concurrency=1, rpm=0, tpm=0, max_queue=2)
+    await controller.acquire(10)
+    admitted_at = asyncio.get_running_loop().time()
+    waiters = [asyncio.create_task(controller.acquire(10)) for _ in range(2)]
+    await asyncio.sleep(0)
+    wait_when_full = controller.estimated_wait()
+    for waiter in waiters:
+        waiter.cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+    assert controller.stats()["queued"] == 0
+    assert controller.estimated_wait() < wait_when_full
+
+    # Queued, not rejected with a 429
+    waiter = asyncio.create_task(controller.acquire(10))
+    await asyncio.sleep(0)
+    assert controller.stats()["queued"] == 1
+    controller.release(admitted_at, 10, 10)
+    await waiter
+    assert controller.active == 1
+
+
+@pytest.mark.asyncio
+async def test_admission_token_bucket_delays_requests():
+    from backend.providers.admission import TokenBucket
+
+    bucket = TokenBucket(per_minute=60)
+    bucket.consume(60)
+    assert 0.9 < bucket.time_until(1) <= 1.0
+    assert TokenBucket(per_minute=0).time_until(1000) == 0
+
+
+def mock_upstream_client(**options):
+    import httpx
+    from backend.providers.mock_upstream import MockUpstreamConfig, create_app
+
+    app = create_app(MockUpstreamConfig(ttft=0, tokens_per_sec=0, seed=7, **options))
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://mock")
+
+
+@pytest.mark.asyncio
+async def test_deepseek_streams_from_mock_upstream(monkeypatch):
+    from backend.providers.deepseek import DeepSeekProvider
+    from backend.providers.http_pool import http_pool
+
+    monkeypatch.setitem(http_pool._clients, "deepseek", mock_upstream_client(tokens=20, token_size=2))
+    provider = DeepSeekProvider()
+    provider.api_key = "sk-mock"
+    provider.base_url = "http://mock/v1"
+
+    chunks = [chunk async for chunk in provider.generate("prompt")]
+    assert len(chunks) == 20
+    assert all(len(chunk.split()) == 2 for chunk in chunks)
+
+
+@pytest.mark.asyncio
+async def test_openai_streams_from_mock_upstream(monkeypatch):
+    from backend.providers.http_pool import http_pool
+    from backend.providers.openai import OpenAIProvider
+
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-mock")
+    monkeypatch.setattr(settings, "OPENAI_BASE_URL", "http://mock/v1")
+    monkeypatch.setitem(http_pool._clients, "openai", mock_upstream_client(tokens=5))
+
+    chunks = [chunk async for chunk in OpenAIProvider().generate("prompt")]
+    assert len(chunks) == 5
+
+
+@pytest.mark.asyncio
+async def test_mock_upstream_errors_surface_as_provider_errors(monkeypatch):
+    from backend.providers.deepseek import DeepSeekProvider
+    from backend.providers.http_pool import http_pool
+
+    monkeypatch.setitem(http_pool._clients, "deepseek", mock_upstream_client(error_rate=1, error_status=429))
+    provider = DeepSeekProvider()
+    provider.api_key = "sk-mock"
+    provider.base_url = "http://mock/v1"
+
+    with pytest.raises(ProviderError) as error:
+        [chunk async for chunk in provider.generate("prompt")]
+    assert error.value.status_code == 429
+
+
+def test_sse_decoder_handles_split_frames_and_keepalives():
+    from backend.utils.sse import SSEDecoder
+
+    stream = (
+        b": keep-alive\r\n\r\n"
+        b"data: {\"a\": 1}\r\n\r\n"
+        b"event: message\ndata: first line\ndata: second line\n\n"
+        b"data:[DONE]\n\n"
+    )
+    # Feed one byte at a time to cross every possible boundary, CRLF included
+    decoder = SSEDecoder()
+    events = []
+    for i in range(len(stream)):
+        events.extend(decoder.feed(stream[i:i + 1]))
+    assert events == ['{"a": 1}', "first line\nsecond line", "[DONE]"]
+
+
+@pytest.mark.asyncio
+async def test_openai_compatible_provider_raises_stream_errors(monkeypatch):
+    from backend.providers.groq import GroqProvider
+    from backend.providers.http_pool import http_pool
+
+    monkeypatch.setitem(http_pool._clients, "groq", mock_upstream_client(tokens=10, midstream_error_rate=1))
+    provider = GroqProvider()
+    provider.api_key = "gsk-mock"
+    provider.base_url = "http://mock/openai/v1"
+
+    chunks = []
+    with pytest.raises(ProviderError):
+        async for chunk in provider.generate("prompt"):
+            chunks.append(chunk)
+    assert len(chunks) == 5
+
+
+def test_openai_compatible_provider_skips_non_object_chunks():
+    from backend.providers.groq import GroqProvider
+
+    provider = GroqProvider()
+    for data in ["[]", "42", '"text"', "null", '{"choices": ["x"]}', '{"choices": {"delta": "x"}}',
+                 '{"choices": [{"delta": "x"}]}', '{"choices": [{"delta": {"content": 5}}]}']:
+        assert provider._content(data) is None
+    assert provider._content('{"choices": [{"delta": {"content": "hi"}}]}') == "hi"
+
+
+@pytest.mark.asyncio
+async def test_registry_loads_lazily_and_isolates_broken_providers(monkeypatch):
+    from backend.providers.registry import ProviderRegistry
+
+    monkeypatch.setattr(settings, "DEEPSEEK_API_KEY", "sk-test")
+    registry = ProviderRegistry({
+        "deepseek": "backend.providers.deepseek:DeepSeekProvider",
+        "broken": "backend.providers.no_such_sdk:BrokenProvider"
+    })
+    assert list(registry) == ["deepseek", "broken"]
+    assert registry.loaded() == []
+
+    assert registry["deepseek"].get_name() == "deepseek"
+    assert registry.load_stats["deepseek"]["status"] == "active"
+    assert registry.loaded() == ["deepseek"]
+
+    await registry.warmup()
+    assert isinstance(registry["broken"], StubProvider)
+    assert registry.load_stats["broken"]["status"] == "failed"
+    assert "ModuleNotFoundError" in registry.load_stats["broken"]["error"]
+    assert registry.load_stats["broken"]["import_seconds"] is not None
+
+def test_router_prefers_fast_reliable_well_rated_providers(monkeypatch):
+    import random
+    from backend.providers.routing import ProviderRouter
+    from backend.utils.metrics import StreamMetrics
+
+    def finished(provider: str, ttft, outcome: str) -> StreamMetrics:
+        stream_metrics = StreamMetrics(provider, "single")
+        stream_metrics.ttft, stream_metrics.outcome = ttft, outcome
+        return stream_metrics
+
+    providers = {name: StubProvider(name) for name in ["openai", "groq", "deepseek"]}
+    router = ProviderRouter(latency_weight=0.1, exploration=0.0, alpha=0.5)
+    # Providers without statistics are tried first
+    assert router.choose(providers) == "openai"
+
+    for _ in range(5):
+        router.observe(finished("openai", 3.0, "success"))
+        router.observe(finished("groq", 0.5, "success"))
+        router.observe(finished("deepseek", 0.4, "error"))
+    router.observe(finished("groq", None, "cancelled"))
+    assert router.stats["groq"].requests == 5
+    assert router.choose(providers) == "groq"
+
+    # Enough dislikes outweigh the latency advantage; a changed rating moves the count
+    router.record_rating(["groq"], -1)
+    router.record_rating(["groq"], -1)
+    router.record_rating(["openai"], -1)
+    router.record_rating(["openai"], 1, previous=-1)
+    router.record_rating(["openai"], 1)
+    assert (router.stats["openai"].likes, router.stats["openai"].dislikes) == (2, 0)
+    assert router.choose(providers) == "openai"
+
+    router.exploration = 1.0
+    monkeypatch.setattr(random, "random", lambda: 0.0)
+    assert router.choose(providers) in ["groq", "deepseek"]
+
+@pytest.mark.asyncio
+async def test_only_upstream_streams_feed_the_router(monkeypatch):
+    from backend.db import init_db
+    from backend.providers.routing import ProviderRouter
+    from backend.routers.chat import provider_stream
+    from backend.utils.metrics import StreamMetrics
+
+    class SlowStub(StubProvider):
+        async def generate(self, prompt: str):
+            await asyncio.sleep(0.05)
+            yield "upstream answer"
+
+    await init_db()
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT_ENABLED", True)
+    provider = SlowStub("routed-source")
+    router = ProviderRouter(latency_weight=0.1, exploration=0.0, alpha=0.5)
+
+    async def request() -> StreamMetrics:
+        stream_metrics = StreamMetrics("routed-source", "single")
+        async for _ in stream_metrics.track(provider_stream(provider, "source tagging prompt", stream_metrics)):
+            pass
+        router.observe(stream_metrics)
+        return stream_metrics
+
+    leader, joiner = await asyncio.gather(request(), request())
+    cached = await request()
+    assert (leader.source, joiner.source, cached.source) == ("upstream", "joined", "cache")
+    assert router.stats["routed-source"].requests == 1
+    assert router.stats["routed-source"].ttft == leader.ttft
@@ -0,0 +1,251 @@
+import pytest
+import asyncio
+import json
+from config import settings
+from backend.streaming.websocket import ConnectionManager
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        self.frames.append(json.loads(text))
+
+    async def send_bytes(self, data: bytes):
+        self.frames.append(data)
+
+@pytest.mark.asyncio
+async def test_tokens_are_batched_per_provider_and_flushed_on_done(monkeypatch):
+    monkeypatch.setattr(settings, "WS_BATCH_WINDOW_MS", 20)
+    monkeypatch.setattr(settings, "WS_BATCH_MAX_BYTES", 1024)
+    manager = ConnectionManager()
+    websocket = FakeWebSocket()
+    await manager.connect(websocket, "chat")
+
+    for word in ["Hello ", "there ", "world "]:
+        await manager.send_provider_token("chat", "openai", word)
+        await manager.send_provider_token("chat", "groq", word.upper())
+    await asyncio.sleep(0)
+    assert websocket.frames == []
+
+    # done flushes the pending tokens immediately, in the same frame
+    await manager.send_provider_token("chat", "openai", "!", True)
+    await asyncio.sleep(0)
+    assert websocket.frames == [
+        {"type": "provider", "provider": "openai", "token": "Hello there world !", "done": True, "seq": 1}
+    ]
+
+    await asyncio.sleep(0.05)
+    assert websocket.frames[1] == {
+        "type": "provider", "provider": "groq", "token": "HELLO THERE WORLD ", "done": False, "seq": 2
+    }
+
+    monkeypatch.setattr(settings, "WS_BATCH_MAX_BYTES", 8)
+    await manager.send_synth_token("chat", "abcd")
+    await manager.send_synth_token("chat", "efgh")
+    await asyncio.sleep(0)
+    assert websocket.frames[2] == {"type": "synth", "token": "abcdefgh", "done": False, "seq": 3}
+
+
+class StalledWebSocket(FakeWebSocket):
+    def __init__(self):
+        super().__init__()
+        self.release = asyncio.Event()
+        self.closed_with = None
+
+    async def send_text(self, text: str):
+        await self.release.wait()
+        await super().send_text(text)
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+@pytest.mark.asyncio
+async def test_slow_consumer_does_not_block_other_viewers(monkeypatch):
+    monkeypatch.setattr(settings, "WS_BATCH_WINDOW_MS", 0)
+    monkeypatch.setattr(settings, "WS_SEND_QUEUE_SIZE", 3)
+    monkeypatch.setattr(settings, "WS_OVERFLOW_POLICY", "coalesce")
+    manager = ConnectionManager()
+    fast, slow = FakeWebSocket(), StalledWebSocket()
+    await manager.connect(fast, "chat")
+    await manager.connect(slow, "chat")
+
+    for i in range(10):
+        await manager.send_provider_token("chat", "openai", str(i))
+        await asyncio.sleep(0)
+    await manager.send_provider_token("chat", "openai", "", True)
+    await asyncio.sleep(0.01)
+    assert len(fast.frames) == 11
+
+    # The stalled socket kept at most 3 frames, with later tokens merged in order
+    slow.release.set()
+    await asyncio.sleep(0.01)
+    assert "".join(frame["token"] for frame in slow.frames) == "0123456789"
+    assert slow.frames[-1]["done"] is True
+    assert len(slow.frames) <= 4
+
+    monkeypatch.setattr(settings, "WS_OVERFLOW_POLICY", "disconnect")
+    slow.release.clear()
+    for i in range(10):
+        await manager.send_provider_token("chat", "openai", str(i))
+        await asyncio.sleep(0)
+    await asyncio.sleep(0.01)
+    assert slow.closed_with == 1013
+    assert manager.active_connections["chat"] == [fast]
+
+
+@pytest.mark.asyncio
+async def test_reconnect_replays_missed_events(monkeypatch):
+    monkeypatch.setattr(settings, "WS_BATCH_WINDOW_MS", 0)
+    monkeypatch.setattr(settings, "WS_REPLAY_MAX_BYTES", 10_000)
+    manager = ConnectionManager()
+    # /api/chat/send hands out the current seq before the stream starts
+    start = manager.last_seq("chat")
+
+    for i in range(5):
+        await manager.send_provider_token("chat", "openai", str(i))
+    late = FakeWebSocket()
+    await manager.connect(late, "chat", last_seq=start)
+    await manager.send_provider_token("chat", "openai", "5", True)
+    await asyncio.sleep(0.01)
+    assert "".join(frame["token"] for frame in late.frames) == "012345"
+    assert [frame["seq"] for frame in late.frames] == list(range(start + 1, start + 7))
+
+    resumed = FakeWebSocket()
+    await manager.connect(resumed, "chat", last_seq=late.frames[3]["seq"])
+    await asyncio.sleep(0.01)
+    assert "".join(frame["token"] for frame in resumed.frames) == "45"
+
+    # Once the budget evicts events the client needs, it is told to reload instead
+    monkeypatch.setattr(settings, "WS_REPLAY_MAX_BYTES", 200)
+    for i in range(20):
+        await manager.send_provider_token("other", "groq", "x" * 20)
+    assert manager.replay.size <= 200
+    stale = FakeWebSocket()
+    await manager.connect(stale, "chat", last_seq=start)
+    await asyncio.sleep(0.01)
+    assert stale.frames == [{"type": "reset", "seq": manager.last_seq("chat")}]
+
+
+@pytest.mark.asyncio
+async def test_sse_generator_resumes_after_last_event_id(monkeypatch):
+    from backend.streaming import sse
+    from backend.streaming.websocket import websocket_manager
+
+    monkeypatch.setattr(settings, "WS_BATCH_WINDOW_MS", 0)
+    monkeypatch.setattr(settings, "SSE_HEARTBEAT_INTERVAL", 0.01)
+    start = websocket_manager.last_seq("sse-chat")
+    for token in ["a", "b", "c"]:
+        await websocket_manager.send_synth_token("sse-chat", token)
+
+    stream = sse.event_generator("sse-chat", last_seq=start + 1)
+    assert await stream.__anext__() == 'id: %d\ndata: {"type": "synth", "token": "b", "done": false, "seq": %d}\n\n' % (
+        start + 2, start + 2
+    )
+    assert (await stream.__anext__()).startswith("id: %d\n" % (start + 3))
+    assert await stream.__anext__() == ": heartbeat\n\n"
+    await stream.aclose()
+    assert "sse-chat" not in websocket_manager.active_connections
+
+
+@pytest.mark.asyncio
+async def test_events_reach_clients_held_by_another_worker(monkeypatch):
+    from backend.streaming.pubsub import RedisPubSub
+    from backend.streaming.resp_broker import RESPBroker
+
+    monkeypatch.setattr(settings, "WS_BATCH_WINDOW_MS", 0)
+    broker = RESPBroker()
+    port = await broker.start()
+    producer = ConnectionManager(RedisPubSub(f"redis://127.0.0.1:{port}"))
+    viewer = ConnectionManager(RedisPubSub(f"redis://127.0.0.1:{port}"))
+    await producer.start()
+    await viewer.start()
+    try:
+        websocket = FakeWebSocket()
+        await viewer.connect(websocket, "chat")
+        start = producer.last_seq("chat")
+        for token in ["a", "b"]:
+            await producer.send_provider_token("chat", "openai", token)
+        await producer.send_provider_token("chat", "openai", "c", True)
+        for _ in range(100):
+            if len(websocket.frames) == 3:
+                break
+            await asyncio.sleep(0.01)
+        assert [frame["token"] for frame in websocket.frames] == ["a", "b", "c"]
+        assert [frame["seq"] for frame in websocket.frames] == [start + 1, start + 2, start + 3]
+
+        # The viewer's replay buffer resumes with the producer's sequence numbers
+        resumed = FakeWebSocket()
+        await viewer.connect(resumed, "chat", last_seq=start + 1)
+        await asyncio.sleep(0.01)
+        assert [frame["token"] for frame in resumed.frames] == ["b", "c"]
+    finally:
+        await producer.close()
+        await viewer.close()
+        await broker.close()
+
+
+@pytest.mark.asyncio
+async def test_binary_framing_is_negotiated_per_connection(monkeypatch):
+    from backend.streaming.framing import BinaryCodec
+
+    monkeypatch.setattr(settings, "WS_BATCH_WINDOW_MS", 0)
+    manager = ConnectionManager()
+    manager.codec = BinaryCodec(["openai", "groq"])
+    legacy, compact = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(legacy, "chat")
+    await manager.connect(compact, "chat", encoding="binary")
+
+    await manager.send_provider_token("chat", "groq", "héllo ")
+    await manager.send_provider_token("chat", "custom", "x", True)
+    await manager.send_synth_token("chat", "done", True)
+    await asyncio.sleep(0.01)
+
+    decoded = [manager.codec.decode(frame) for frame in compact.frames]
+    assert decoded[0] == {"type": "hello", "encoding": "binary", "providers": ["openai", "groq"]}
+    assert decoded[1:] == legacy.frames
+    assert len(compact.frames[1]) == 7 + len("héllo ".encode("utf-8"))
+
+
+@pytest.mark.asyncio
+async def test_overflow_keeps_control_frames_and_disconnect_empties_the_gauge(monkeypatch):
+    from backend.streaming.websocket import websocket_queued
+
+    monkeypatch.setattr(settings, "WS_BATCH_WINDOW_MS", 0)
+    monkeypatch.setattr(settings, "WS_SEND_QUEUE_SIZE", 2)
+    monkeypatch.setattr(settings, "WS_OVERFLOW_POLICY", "drop_oldest")
+    manager = ConnectionManager()
+    queued_before = websocket_queued.get()
+    subscriber = manager.subscribe("chat")
+
+    await manager.send_provider_token("chat", "openai", "", True)
+    await manager.send_provider_token("chat", "groq", "a")
+    await manager.send_synth_token("chat", "", True)
+    await manager.send_provider_token("chat", "groq", "b")
+    # Only token frames were evicted; both done frames are still queued
+    queued = [entry[0] for entry in subscriber.queue]
+    assert [(frame["type"], frame["done"]) for frame in queued] == [
+        ("provider", True), ("synth", True), ("provider", False)
+    ]
+    assert queued[-1]["token"] == "b"
+
+    manager.disconnect(subscriber, "chat")
+    assert websocket_queued.get() == queued_before
+
+
+def test_replay_store_expires_quiet_chats_from_the_front(monkeypatch):
+    from backend.streaming.replay import ReplayStore
+
+    monkeypatch.setattr(settings, "WS_REPLAY_TTL", 60)
+    store = ReplayStore()
+    for chat_id in ["old", "older", "live"]:
+        store.record(chat_id, {"type": "synth", "token": chat_id, "done": False}, json.dumps)
+    for chat_id in ["old", "older"]:
+        store._buffers[chat_id].updated -= 120
+
+    store.record("live", {"type": "synth", "token": "more", "done": False}, json.dumps)
+    assert list(store._buffers) == ["live"]
+    assert store.size == sum(buffer.size for buffer in store._buffers.values())